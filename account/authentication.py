@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_TIMEOUT = 60
+LOCAL_CACHE_TIMEOUT = 5
+LOCAL_CACHE_SIZE = 1024
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU with a per-entry time to live."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+local_tokens = LRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TIMEOUT)
+
+
+def token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def invalidate_token(key):
+    local_tokens.delete(key)
+    cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` that skips the token/user query for recently seen keys.
+
+    Lookups go to a per-process LRU first and then to the shared cache (Redis).
+    ``invalidate_token`` drops both whenever a token or its user is saved or
+    deleted (see ``account.signals``); other processes' LRU entries expire after
+    ``LOCAL_CACHE_TIMEOUT`` seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        user = local_tokens.get(key)
+        if user is None:
+            user = cache.get(token_cache_key(key))
+            if user is None:
+                user, token = super().authenticate_credentials(key)
+                cache.set(token_cache_key(key), user, TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(key, user)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,12 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from account.utils import get_mail_metrics
+
+
+class Command(BaseCommand):
+    help = 'Print mail dispatcher metrics: queue length, SMTP connections opened, messages sent and throughput'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(get_mail_metrics(), indent=2))
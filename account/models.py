@@ -1,11 +1,10 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.core.mail import send_mail
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
-from django.urls import reverse
 from django_rest_passwordreset.signals import reset_password_token_created
-from django.core.mail import send_mail
+
+from account import utils
 
 
 class MyUserManager(BaseUserManager):
@@ -53,20 +52,8 @@ class MyUser(AbstractUser):
         self.activation_code = activation_code
 
     def send_activation_code(self):
-        print(self.activation_code, '12345678976543456')
-        activation_url = f'http://localhost:5000/v1/api/account/activate/{self.activation_code}/'
-        message = f""" 
-            Thank you for signing up.
-            Please, activate your account.
-            Activation link: {activation_url}
-        """
-        send_mail(
-            'Activate your account',
-            message,
-            'test@test.com',
-            [self.email,],
-            fail_silently=False
-        )
+        email, activation_code = self.email, self.activation_code
+        transaction.on_commit(lambda: utils.send_activation_code.delay(email, activation_code))
 
     def __str__(self):
         return f'{self.id} - {self.email}'
@@ -74,12 +61,5 @@ class MyUser(AbstractUser):
 
 @receiver(reset_password_token_created)
 def password_reset_token_created(sender, instance, reset_password_token, *args, **kwargs):
-
-    email_plaintext_message = "{}?token={}".format(reverse('password_reset:reset-password-request'), reset_password_token.key)
-
-    send_mail(
-        "Password Reset for {title}".format(title="Some website title"),
-        email_plaintext_message,
-        "noreply@somehost.local",
-        [reset_password_token.user.email]
-    )
+    email, token = reset_password_token.user.email, reset_password_token.key
+    transaction.on_commit(lambda: utils.send_reset_code.delay(email, token))
@@ -0,0 +1,21 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+from .models import MyUser
+
+
+@receiver(post_save, sender=MyUser)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # cached users would keep an old is_active flag or password hash
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        transaction.on_commit(partial(invalidate_token, key))
+
+
+@receiver([post_save, post_delete], sender=Token)
+def invalidate_changed_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_token, instance.key))
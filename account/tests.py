@@ -1,3 +1,257 @@
-from django.test import TestCase
+import json
+import socket
+from collections import defaultdict
+from smtplib import SMTPDataError
+from unittest import mock
 
-# Create your tests here.
+from aiosmtpd.controller import Controller
+from django.core import mail
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from account import utils
+from account.authentication import local_tokens, token_cache_key
+from account.models import MyUser
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+        self.reply = '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reply.startswith('250'):
+            self.messages.append(envelope)
+            self.peers.add(session.peer)
+        return self.reply
+
+
+class FakeRedis:
+    """The list, hash and key commands the mail queue uses, kept in memory."""
+
+    def __init__(self):
+        self.lists = defaultdict(list)
+        self.hashes = defaultdict(dict)
+        self.keys = {}
+
+    def rpush(self, key, *values):
+        self.lists[key].extend(values)
+
+    def lpush(self, key, *values):
+        for value in values:
+            self.lists[key].insert(0, value)
+
+    def lrange(self, key, start, end):
+        return self.lists[key][start:None if end == -1 else end + 1]
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lrange(key, start, end)
+
+    def llen(self, key):
+        return len(self.lists[key])
+
+    def hincrby(self, key, field, amount):
+        self.hashes[key][field] = self.hashes[key].get(field, 0) + amount
+
+    def hset(self, key, field, value):
+        self.hashes[key][field] = value
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.keys.pop(key, None)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((getattr(self.client, name), args, kwargs))
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+class SMTPTestCase(SimpleTestCase):
+    """Runs the SMTP backend against a local aiosmtpd server instead of a real relay."""
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=free_port())
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=self.controller.hostname, EMAIL_PORT=self.controller.port, EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(utils.close_pooled_connection)
+
+    def messages(self, count):
+        return [mail.EmailMessage(f'Subject {n}', 'body', utils.FROM_EMAIL, [f'user{n}@example.com'])
+                for n in range(count)]
+
+
+class DeliverTest(SMTPTestCase):
+    def test_batch_uses_one_connection(self):
+        self.assertEqual(utils.deliver(self.messages(5)), 5)
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(len(self.handler.peers), 1)
+
+    def test_send_emails_task(self):
+        utils.send_emails.delay([('Hello', 'body', utils.FROM_EMAIL, ['user@example.com'])])
+        self.assertEqual([message.rcpt_tos for message in self.handler.messages], [['user@example.com']])
+
+    @mock.patch('account.utils.get_redis')
+    def test_pooled_connection_is_reused(self, get_redis):
+        utils.get_pooled_connection().send_messages(self.messages(2))
+        utils.get_pooled_connection().send_messages(self.messages(3))
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertEqual(len(self.handler.peers), 1)
+        get_redis.return_value.hincrby.assert_called_once_with(utils.MAIL_METRICS_KEY, 'connections_opened', 1)
+
+
+class DrainMailQueueTest(SMTPTestCase):
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        patcher = mock.patch('account.utils.get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def enqueue(self, count):
+        self.redis.rpush(utils.MAIL_QUEUE_KEY, *[
+            json.dumps([message.subject, message.body, message.from_email, message.to])
+            for message in self.messages(count)
+        ])
+
+    @property
+    def metrics(self):
+        return self.redis.hashes[utils.MAIL_METRICS_KEY]
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=False)
+    def test_queue_schedules_one_drain(self):
+        with mock.patch.object(utils.drain_mail_queue, 'apply_async') as apply_async:
+            utils.queue_messages(self.messages(2))
+            utils.queue_messages(self.messages(1))
+        apply_async.assert_called_once_with(countdown=utils.MAIL_BATCH_WINDOW)
+        self.assertEqual(self.redis.llen(utils.MAIL_QUEUE_KEY), 3)
+
+    def test_drains_in_batches_over_one_connection(self):
+        self.enqueue(2 * utils.MAIL_BATCH_SIZE + 20)
+        self.redis.set(utils.MAIL_DRAIN_SCHEDULED_KEY, 1)
+        utils.drain_mail_queue()
+        self.assertEqual(len(self.handler.messages), 2 * utils.MAIL_BATCH_SIZE + 20)
+        self.assertEqual([message.rcpt_tos[0] for message in self.handler.messages[:2]],
+                         ['user0@example.com', 'user1@example.com'])
+        self.assertEqual(len(self.handler.peers), 1)
+        self.assertEqual(self.redis.llen(utils.MAIL_QUEUE_KEY), 0)
+        self.assertNotIn(utils.MAIL_DRAIN_SCHEDULED_KEY, self.redis.keys)
+        self.assertEqual(self.metrics['batches_sent'], 3)
+        self.assertEqual(self.metrics['messages_sent'], 2 * utils.MAIL_BATCH_SIZE + 20)
+        self.assertEqual(self.metrics['connections_opened'], 1)
+
+    def test_reconnects_when_server_disconnected(self):
+        utils.get_pooled_connection().connection.close()
+        self.enqueue(3)
+        utils.drain_mail_queue()
+        self.assertEqual(len(self.handler.messages), 3)
+        self.assertEqual(self.metrics['connections_opened'], 2)
+        self.assertEqual(self.metrics['messages_sent'], 3)
+
+    def test_requeues_failed_batch(self):
+        self.enqueue(3)
+        queued = list(self.redis.lists[utils.MAIL_QUEUE_KEY])
+        self.handler.reply = '554 Rejected'
+        with self.assertRaises(SMTPDataError):
+            utils.drain_mail_queue()
+        self.assertEqual(self.redis.lists[utils.MAIL_QUEUE_KEY], queued)
+        self.assertEqual(self.metrics['failed_batches'], 1)
+        self.assertNotIn('messages_sent', self.metrics)
+        self.handler.reply = '250 OK'
+        utils.drain_mail_queue()
+        self.assertEqual(len(self.handler.messages), 3)
+
+
+class LogOutTest(APITestCase):
+    def setUp(self):
+        user = MyUser.objects.create_user(email='reader@example.com', password='pass1234')
+        user.is_active = True
+        user.save()
+        self.key = Token.objects.create(user=user).key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def test_logout_drops_cached_token_after_commit(self):
+        self.assertEqual(self.client.get('/v1/api/chat/messages/unread/').status_code, 200)
+        self.assertIsNotNone(cache.get(token_cache_key(self.key)))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/v1/api/account/logout/')
+            self.assertIsNotNone(local_tokens.get(self.key))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(callbacks)
+        self.assertIsNone(local_tokens.get(self.key))
+        self.assertIsNone(cache.get(token_cache_key(self.key)))
+        self.assertEqual(self.client.get('/v1/api/chat/messages/unread/').status_code, 401)
+
+
+class TokenCacheInvalidationTest(APITestCase):
+    def setUp(self):
+        self.user = MyUser.objects.create_user(email='reader@example.com', password='pass1234')
+        self.user.is_active = True
+        self.user.save()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.get(), 200)
+
+    def get(self):
+        return self.client.get('/v1/api/chat/messages/unread/').status_code
+
+    def test_deactivated_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get(), 401)
+
+    def test_deleted_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.get(), 401)
+
+    def test_deleted_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.get(), 401)
+
+    def test_password_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-pass-5678')
+            self.user.save()
+        self.assertIsNone(local_tokens.get(self.token.key))
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
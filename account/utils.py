@@ -1,32 +1,148 @@
-from django.core.mail import send_mail
+import json
+import time
+from smtplib import SMTPException, SMTPServerDisconnected
+
+import redis
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.urls import reverse
 from forum_settings.celery_ import app
 
-@app.task
-def send_activation_code(email, activation_code):
-    activation_url = f'http://localhost:8000/v1/api/account/activate/{activation_code}'
+FROM_EMAIL = 'test@test.com'
+
+MAIL_QUEUE_KEY = 'mail:queue'
+MAIL_DRAIN_SCHEDULED_KEY = 'mail:drain-scheduled'
+MAIL_METRICS_KEY = 'mail:metrics'
+MAIL_BATCH_SIZE = 50
+MAIL_BATCH_WINDOW = 2
+
+EMAIL_TASK_OPTIONS = {
+    'autoretry_for': (SMTPException, OSError, redis.RedisError),
+    'retry_backoff': True,
+    'retry_backoff_max': 600,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+_redis = None
+_connection = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(f'{settings.REDIS_URL}/2')
+    return _redis
+
+
+def get_pooled_connection():
+    """Return this worker's SMTP connection, opening it only when there is none."""
+    global _connection
+    if _connection is None:
+        _connection = get_connection(fail_silently=False)
+        _connection.open()
+        get_redis().hincrby(MAIL_METRICS_KEY, 'connections_opened', 1)
+    return _connection
+
+
+def close_pooled_connection():
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+
+def deliver(messages):
+    # one SMTP connection (and TLS handshake) for the whole batch
+    with get_connection(fail_silently=False) as connection:
+        return connection.send_messages(messages)
+
+
+def queue_messages(messages):
+    """Queue messages for the batching dispatcher, or send them inline in eager mode."""
+    if settings.CELERY_TASK_ALWAYS_EAGER:
+        return deliver(messages)
+    client = get_redis()
+    client.rpush(MAIL_QUEUE_KEY, *[
+        json.dumps([message.subject, message.body, message.from_email, message.to]) for message in messages
+    ])
+    if client.set(MAIL_DRAIN_SCHEDULED_KEY, 1, nx=True, ex=60):
+        drain_mail_queue.apply_async(countdown=MAIL_BATCH_WINDOW)
+
+
+def get_mail_metrics():
+    client = get_redis()
+    metrics = {key.decode(): float(value) for key, value in client.hgetall(MAIL_METRICS_KEY).items()}
+    metrics['queued'] = client.llen(MAIL_QUEUE_KEY)
+    return metrics
+
+
+def activation_message(email, activation_code):
+    activation_url = f'{settings.SITE_URL}/v1/api/account/activate/{activation_code}/'
     message = f""" 
         Thank you for signing up.
         Please, activate your account.
         Activation link: {activation_url}
     """
-    send_mail(
-        'Activate your account',
+    return EmailMessage('Activate your account', message, FROM_EMAIL, [email, ])
+
+
+def reset_message(email, token):
+    message = "{}?token={}".format(reverse('password_reset:reset-password-request'), token)
+    return EmailMessage(
+        "Password Reset for {title}".format(title="Some website title"),
         message,
-        'test@test.com',
+        "noreply@somehost.local",
         [email, ],
-        fail_silently=False
     )
 
 
-@app.task
-def send_reset_code(email, activation_code):
-    message = f"""
-        Activation code: {activation_code}
-    """
-    send_mail(
-        'Reset your password',
-        message,
-        'test@test.com',
-        [email, ],
-        fail_silently=False
-    )
\ No newline at end of file
+@app.task(**EMAIL_TASK_OPTIONS)
+def send_activation_code(email, activation_code):
+    queue_messages([activation_message(email, activation_code)])
+
+
+@app.task(**EMAIL_TASK_OPTIONS)
+def send_reset_code(email, token):
+    queue_messages([reset_message(email, token)])
+
+
+@app.task(**EMAIL_TASK_OPTIONS)
+def send_emails(datatuple):
+    """Queue ``(subject, message, from_email, recipient_list)`` tuples for batched delivery."""
+    queue_messages([EmailMessage(*data) for data in datatuple])
+
+
+@app.task(**EMAIL_TASK_OPTIONS)
+def drain_mail_queue():
+    """Send queued mail in batches over the worker's persistent SMTP connection."""
+    client = get_redis()
+    while True:
+        with client.pipeline() as pipe:
+            pipe.lrange(MAIL_QUEUE_KEY, 0, MAIL_BATCH_SIZE - 1)
+            pipe.ltrim(MAIL_QUEUE_KEY, MAIL_BATCH_SIZE, -1)
+            batch = pipe.execute()[0]
+        if not batch:
+            break
+        messages = [EmailMessage(*json.loads(data)) for data in batch]
+        started = time.perf_counter()
+        try:
+            try:
+                sent = get_pooled_connection().send_messages(messages)
+            except SMTPServerDisconnected:
+                close_pooled_connection()
+                sent = get_pooled_connection().send_messages(messages)
+        except Exception:
+            close_pooled_connection()
+            client.lpush(MAIL_QUEUE_KEY, *reversed(batch))
+            client.hincrby(MAIL_METRICS_KEY, 'failed_batches', 1)
+            raise
+        elapsed = time.perf_counter() - started
+        with client.pipeline() as pipe:
+            pipe.hincrby(MAIL_METRICS_KEY, 'messages_sent', sent)
+            pipe.hincrby(MAIL_METRICS_KEY, 'batches_sent', 1)
+            pipe.hset(MAIL_METRICS_KEY, 'messages_per_second', round(sent / elapsed, 2) if elapsed else sent)
+            pipe.execute()
+    client.delete(MAIL_DRAIN_SCHEDULED_KEY)
+    if client.llen(MAIL_QUEUE_KEY) and client.set(MAIL_DRAIN_SCHEDULED_KEY, 1, nx=True, ex=60):
+        drain_mail_queue.delay()
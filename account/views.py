@@ -38,6 +38,7 @@ class LogOutView(APIView):
 
     def post(self, request):
         user = request.user
+        # the Token post_delete receiver drops the cached token once this commits
         Token.objects.filter(user=user).delete()
         return Response('Successfully logged out', status=status.HTTP_200_OK)
 
@@ -61,6 +62,7 @@ class ChangePasswordView(generics.UpdateAPIView):
 
             self.object.set_password(serializer.data.get("new_password"))
 
+            # saving the user drops its cached tokens on commit
             self.object.save()
             response = {
                 'status': 'success',
@@ -0,0 +1,146 @@
+"""Generate a large, reproducible dataset for the endpoint benchmarks.
+
+Every row is written with ``bulk_create`` in batches, so seeding a million posts
+keeps memory bounded by the batch size. Benchmark users are ``bench<n>@example.com``
+and benchmark themes are ``bench-<n>``; ``flush`` removes both, and everything that
+cascades from them.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from account.models import MyUser
+from chat.models import Message
+from main.models import Comment, Likes, Post, Rating, Theme
+
+PASSWORD = 'bench-password'
+EMAIL = 'bench{}@example.com'
+THEME_SLUG = 'bench-{}'
+
+WORDS = (
+    'fish', 'river', 'lake', 'bait', 'rod', 'reel', 'hook', 'line', 'boat', 'pike', 'carp', 'trout',
+    'salmon', 'perch', 'catfish', 'lure', 'fly', 'float', 'winter', 'ice', 'spring', 'night', 'shore',
+    'current', 'depth', 'weather', 'morning', 'record', 'catch', 'release', 'net', 'camp', 'knot',
+)
+
+SCALE = {
+    'users': 1000,
+    'themes': 20,
+    'posts': 100000,
+    'comments': 3,
+    'likes': 5,
+    'ratings': 2,
+    'messages': 100000,
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the spread-out timestamps instead of stamping ``now()``."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Seeder:
+    def __init__(self, scale, batch_size=5000, seed=1, days=365, log=print):
+        self.scale = {**SCALE, **scale}
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.days = days
+        self.log = log
+        self.now = timezone.now()
+
+    def sentence(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words))
+
+    def timestamp(self):
+        return self.now - timedelta(seconds=self.random.randrange(self.days * 24 * 3600))
+
+    def insert(self, model, objects):
+        count = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            count += len(batch)
+        self.log(f'{model.__name__}: {count}')
+        return count
+
+    def ids(self, queryset):
+        return list(queryset.order_by('pk').values_list('pk', flat=True))
+
+    def seed(self):
+        password = make_password(PASSWORD)
+        self.insert(MyUser, (
+            MyUser(email=EMAIL.format(n), password=password, is_active=True)
+            for n in range(self.scale['users'])
+        ))
+        users = self.ids(MyUser.objects.filter(email__startswith='bench', email__endswith='@example.com'))
+        Token.objects.get_or_create(user_id=users[0])
+
+        self.insert(Theme, (
+            Theme(slug=THEME_SLUG.format(n), name=f'Bench theme {n}') for n in range(self.scale['themes'])
+        ))
+        themes = [THEME_SLUG.format(n) for n in range(self.scale['themes'])]
+
+        with explicit_timestamps(Post._meta.get_field('created_at')):
+            self.insert(Post, (
+                Post(author_id=self.random.choice(users), theme_id=self.random.choice(themes),
+                     title=self.sentence(4).capitalize(), text=self.sentence(60), created_at=self.timestamp())
+                for _ in range(self.scale['posts'])
+            ))
+        posts = self.ids(Post.objects.filter(theme__in=themes))
+
+        self.insert(Comment, (
+            Comment(post_id=post, author_id=self.random.choice(users), text=self.sentence(15))
+            for post in posts for _ in range(self.random.randint(0, 2 * self.scale['comments']))
+        ))
+        self.insert(Likes, (
+            Likes(post_id=post, author_id=author, likes=self.random.random() < 0.9)
+            for post in posts for author in self.sample(users, self.scale['likes'])
+        ))
+        self.insert(Rating, (
+            Rating(post_id=post, author_id=author, rating=self.random.randint(1, 5))
+            for post in posts for author in self.sample(users, self.scale['ratings'])
+        ))
+        with explicit_timestamps(Message._meta.get_field('timestamp')):
+            self.insert(Message, (
+                Message(sender_id=sender, receiver_id=receiver, message=self.sentence(10),
+                        timestamp=self.timestamp(), is_received=self.random.random() < 0.7)
+                for sender, receiver in self.pairs(users, self.scale['messages'])
+            ))
+        # the bench0 user reads these in the chat benchmark
+        self.insert(Message, (
+            Message(sender_id=self.random.choice(users[1:]), receiver_id=users[0], message=self.sentence(10))
+            for _ in range(min(self.scale['messages'], 200))
+        ))
+
+    def sample(self, population, average):
+        return self.random.sample(population, min(self.random.randint(0, 2 * average), len(population)))
+
+    def pairs(self, users, count):
+        for _ in range(count):
+            sender, receiver = self.random.sample(users, 2)
+            yield sender, receiver
+
+
+def flush():
+    Theme.objects.filter(slug__startswith='bench-').delete()
+    return MyUser.objects.filter(email__startswith='bench', email__endswith='@example.com').delete()[0]
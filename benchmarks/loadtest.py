@@ -0,0 +1,100 @@
+"""Compare throughput of the sync and async read endpoints under high concurrency.
+
+Seed data with ``manage.py seed_benchmark``, start the project under an ASGI
+server against the database you want to measure (SQLite or Postgres, same
+fixture for both runs), then::
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --token <key> \
+        --concurrency 200 --requests 5000 --post-id 1
+
+Every sync endpoint is measured next to its async twin under ``/v1/api/async/``.
+Only the standard library is used, so the harness adds no client-side threads.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+ENDPOINTS = [
+    ('/v1/api/themes/', '/v1/api/async/themes/'),
+    ('/v1/api/posts/', '/v1/api/async/posts/'),
+    ('/v1/api/post/', '/v1/api/async/post/'),
+    ('/v1/api/post/{post_id}/', '/v1/api/async/post/{post_id}/'),
+]
+
+
+async def fetch(host, port, path, token):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n'
+    if token:
+        request += f'Authorization: Token {token}\r\n'
+    writer.write((request + '\r\n').encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(status_line.split()[1])
+
+
+async def measure(host, port, path, token, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, path, token)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'path': path,
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+    }
+
+
+async def main(options):
+    url = urlsplit(options.url)
+    results = []
+    for sync_path, async_path in ENDPOINTS:
+        if '{post_id}' in sync_path and options.post_id is None:
+            continue
+        for path in (sync_path, async_path):
+            path = path.format(post_id=options.post_id)
+            result = await measure(url.hostname, url.port or 80, path, options.token,
+                                   options.requests, options.concurrency)
+            results.append(result)
+            print('{path:<35} {rps:>9} req/s  p50 {p50_ms:>8} ms  p95 {p95_ms:>8} ms  '
+                  'p99 {p99_ms:>8} ms  errors {errors}'.format(**result))
+    if options.output:
+        with open(options.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--token', help='DRF token key for the authenticated post endpoints')
+    parser.add_argument('--post-id', type=int, help='post used for the detail endpoints')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    asyncio.run(main(parser.parse_args()))
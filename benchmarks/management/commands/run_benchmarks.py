@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import ENDPOINTS, Runner, compare, dump, load
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main endpoints on the seeded dataset and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--memory-iterations', type=int, default=20)
+        parser.add_argument('--cold-cache', action='store_true', help='clear the cache before every request')
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), dest='endpoints')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        try:
+            runner = Runner(options['iterations'], options['warmup'], options['memory_iterations'],
+                            options['cold_cache'])
+        except LookupError as error:
+            raise CommandError(error)
+        results = runner.run(options['endpoints'], log=self.stdout.write)
+        if options['output']:
+            dump(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        if options['compare']:
+            self.stdout.write(f'{"endpoint":<16}{"metric":<10}{"before":>12}{"after":>12}{"change":>10}')
+            for name, metric, before, after, change in compare(load(options['compare']), results):
+                change = '-' if change is None else f'{change:+.1f}%'
+                self.stdout.write(f'{name:<16}{metric:<10}{before:>12}{after:>12}{change:>10}')
@@ -0,0 +1,30 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.fixtures import SCALE, Seeder, flush
+from main.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a large benchmark dataset (try --posts 1000000 for the full-scale run)'
+
+    def add_arguments(self, parser):
+        for name, default in SCALE.items():
+            per_post = ' per post on average' if name in ('comments', 'likes', 'ratings') else ''
+            parser.add_argument(f'--{name}', type=int, default=default, help=f'{name}{per_post} (default {default})')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--flush', action='store_true', help='remove earlier benchmark data first')
+        parser.add_argument('--skip-search-index', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['themes'] < 1:
+            raise CommandError('At least 2 users and 1 theme are needed')
+        if options['flush']:
+            self.stdout.write(f'Removed {flush()} benchmark rows')
+        scale = {name: options[name] for name in SCALE}
+        Seeder(scale, batch_size=options['batch_size'], seed=options['seed'], log=self.stdout.write).seed()
+        Post.objects.rebuild_counters()
+        if not options['skip_search_index']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Benchmark data is ready'))
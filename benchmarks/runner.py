@@ -0,0 +1,131 @@
+"""Measure latency percentiles, queries per request and peak memory of the main endpoints.
+
+Requests go through the Django test client in-process, so the numbers cover the
+full middleware/view/serializer stack without any network noise. Run the same
+dataset against SQLite and Postgres by switching the database settings.
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from main.models import Theme
+from main.profiling import QueryProfile
+from .fixtures import EMAIL, THEME_SLUG, WORDS
+
+ENDPOINTS = {
+    'post-list': '/v1/api/post/',
+    'post-search': '/v1/api/post/search/?q={word}',
+    'chat-messages': '/v1/api/chat/messages/',
+    'theme-posts': '/v1/api/themes/{theme}/',
+}
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries', 'peak_kib')
+
+
+def percentile(quantiles, value):
+    return round(quantiles[value - 1] * 1000, 3)
+
+
+def summarize(latencies, queries, peaks, statuses):
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'p50_ms': percentile(quantiles, 50),
+        'p95_ms': percentile(quantiles, 95),
+        'p99_ms': percentile(quantiles, 99),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries': round(statistics.fmean(queries), 2),
+        'peak_kib': round(max(peaks) / 1024, 1),
+        'statuses': sorted(set(statuses)),
+    }
+
+
+class Runner:
+    def __init__(self, iterations=200, warmup=20, memory_iterations=20, cold_cache=False):
+        self.iterations = max(iterations, 2)
+        self.warmup = warmup
+        self.memory_iterations = max(memory_iterations, 1)
+        self.cold_cache = cold_cache
+        token = Token.objects.filter(user__email=EMAIL.format(0)).first()
+        if token is None:
+            raise LookupError('No benchmark data: run "manage.py seed_benchmark" first')
+        self.client = Client(SERVER_NAME='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.theme = THEME_SLUG.format(0) if Theme.objects.filter(slug=THEME_SLUG.format(0)).exists() else None
+
+    def get(self, path):
+        if self.cold_cache:
+            cache.clear()
+        return self.client.get(path)
+
+    def measure(self, path):
+        for _ in range(self.warmup):
+            self.get(path)
+        latencies, queries, statuses = [], [], []
+        for _ in range(self.iterations):
+            with QueryProfile() as profile:
+                started = time.perf_counter()
+                response = self.get(path)
+                latencies.append(time.perf_counter() - started)
+            queries.append(profile.count)
+            statuses.append(response.status_code)
+        # tracemalloc slows every allocation down, so memory gets its own pass
+        peaks = []
+        tracemalloc.start()
+        try:
+            for _ in range(self.memory_iterations):
+                tracemalloc.reset_peak()
+                self.get(path)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        return summarize(latencies, queries, peaks, statuses)
+
+    def run(self, names=None, log=print):
+        results = {}
+        # the middleware would add its own overhead to every request
+        with override_settings(QUERY_PROFILING=False):
+            for name, path in ENDPOINTS.items():
+                if names and name not in names:
+                    continue
+                path = path.format(word=WORDS[0], theme=self.theme)
+                results[name] = {'path': path, **self.measure(path)}
+                log(f'{name}: p50 {results[name]["p50_ms"]} ms, p99 {results[name]["p99_ms"]} ms, '
+                    f'{results[name]["queries"]} queries, peak {results[name]["peak_kib"]} KiB')
+        return {
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'iterations': self.iterations,
+            'cold_cache': self.cold_cache,
+            'endpoints': results,
+        }
+
+
+def compare(baseline, current):
+    """Yield ``(endpoint, metric, before, after, change %)`` for endpoints present in both runs."""
+    for name, result in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        for metric in METRICS:
+            old, new = before[metric], result[metric]
+            change = round((new - old) / old * 100, 1) if old else None
+            yield name, metric, old, new, change
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def dump(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
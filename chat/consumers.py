@@ -0,0 +1,46 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    return f'chat.user.{user_id}'
+
+
+def push_message(message, data):
+    """Send ``data`` to the receiver's open sockets.
+
+    The message is already saved, and the receiver will get it from the REST
+    endpoints anyway, so a channel layer failure is logged instead of raised.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            user_group(message.receiver_id), {'type': 'chat.message', 'message': data},
+        )
+    except Exception:
+        logger.exception('Could not push message %s to user %s', message.pk, message.receiver_id)
+
+
+class MessageConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        user = self.scope['user']
+        if user.is_anonymous:
+            await self.close(code=4401)
+            return
+        self.group_name = user_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def chat_message(self, event):
+        await self.send_json(event['message'])
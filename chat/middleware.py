@@ -0,0 +1,38 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def get_token_user(key):
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return AnonymousUser()
+    if not token.user.is_active:
+        return AnonymousUser()
+    return token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """Authenticate websocket connections with the DRF ``Token`` used by the REST API.
+
+    Browsers cannot set headers on a websocket handshake, so the key may be passed
+    either as ``Authorization: Token <key>`` or as a ``?token=<key>`` query parameter.
+    """
+
+    def get_key(self, scope):
+        headers = dict(scope.get('headers', []))
+        authorization = headers.get(b'authorization', b'').decode().split()
+        if len(authorization) == 2 and authorization[0].lower() == 'token':
+            return authorization[1]
+        query = parse_qs(scope.get('query_string', b'').decode())
+        return query.get('token', [None])[0]
+
+    async def __call__(self, scope, receive, send):
+        key = self.get_key(scope)
+        scope['user'] = await get_token_user(key) if key else AnonymousUser()
+        return await super().__call__(scope, receive, send)
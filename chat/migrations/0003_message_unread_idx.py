@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_received', False)), fields=['receiver', 'is_received'], name='chat_message_unread_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:25
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(django.db.models.functions.comparison.Least('sender', 'receiver'), django.db.models.functions.comparison.Greatest('sender', 'receiver'), models.F('timestamp'), name='chat_message_conversation_idx'),
+        ),
+    ]
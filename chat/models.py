@@ -1,7 +1,34 @@
 from django.db import models
+from django.db.models.functions import Greatest, Least
 from account.models import MyUser
 
 
+class MessageQuerySet(models.QuerySet):
+    def with_participants(self):
+        return self.annotate(user_low=Least('sender', 'receiver'), user_high=Greatest('sender', 'receiver'))
+
+    def conversation(self, user_id, other_id):
+        user_low, user_high = sorted((user_id, other_id))
+        return self.with_participants().filter(user_low=user_low, user_high=user_high)
+
+    def conversations(self, user):
+        last_message = Message.objects.with_participants().filter(
+            user_low=models.OuterRef('user_low'), user_high=models.OuterRef('user_high'),
+        ).order_by('-timestamp', '-id')
+        peer = models.Case(
+            models.When(user_low=user.pk, then=models.F('user_high')),
+            default=models.F('user_low'),
+        )
+        return self.filter(
+            models.Q(sender=user) | models.Q(receiver=user),
+        ).with_participants().values('user_low', 'user_high').annotate(
+            user=peer,
+            last_message=models.Subquery(last_message.values('message')[:1]),
+            last_timestamp=models.Max('timestamp'),
+            unread=models.Count('id', filter=models.Q(receiver=user, is_received=False)),
+        ).order_by('-last_timestamp')
+
+
 class Message(models.Model):
     sender = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='sender')
     receiver = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='receiver')
@@ -9,8 +36,17 @@ class Message(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_received = models.BooleanField(default=False)
 
+    objects = MessageQuerySet.as_manager()
+
     def __str__(self):
         return self.message
 
     class Meta:
-        ordering = ('timestamp',)
\ No newline at end of file
+        ordering = ('timestamp',)
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='chat_message_ts_id_idx'),
+            models.Index(fields=['receiver', 'is_received'], name='chat_message_unread_idx',
+                         condition=models.Q(is_received=False)),
+            models.Index(Least('sender', 'receiver'), Greatest('sender', 'receiver'), models.F('timestamp'),
+                         name='chat_message_conversation_idx'),
+        ]
\ No newline at end of file
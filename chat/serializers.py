@@ -27,4 +27,11 @@ class MessageSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         sender = request.user
         validated_data['sender'] = sender
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+
+class ConversationSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    last_message = serializers.CharField()
+    last_timestamp = serializers.DateTimeField()
+    unread = serializers.IntegerField()
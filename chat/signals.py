@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .consumers import push_message
+from .models import Message
+from .serializers import MessageSerializer
+
+
+@receiver(post_save, sender=Message)
+def deliver_new_message(sender, instance, created, **kwargs):
+    if created:
+        data = MessageSerializer(instance).data
+        transaction.on_commit(lambda: push_message(instance, data))
@@ -1,3 +1,164 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from account.models import MyUser
+from .middleware import TokenAuthMiddleware
+from .models import Message
+from .routing import websocket_urlpatterns
+
+application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+def create_user(email):
+    user = MyUser.objects.create_user(email=email, password='pass1234')
+    user.is_active = True
+    user.save()
+    return user, Token.objects.create(user=user).key
+
+
+def post_message(key, receiver, text):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+    return client.post('/v1/api/chat/messages/', {'receiver': receiver, 'message': text})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class MessageConsumerTest(TransactionTestCase):
+    """Messages are pushed on commit, so these run without a wrapping transaction."""
+
+    def setUp(self):
+        self.sender, self.sender_key = create_user('sender@example.com')
+        self.receiver, self.receiver_key = create_user('receiver@example.com')
+
+    async def test_connect_with_token_query(self):
+        communicator = WebsocketCommunicator(application, f'/ws/chat/?token={self.receiver_key}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+    async def test_connect_with_token_header(self):
+        communicator = WebsocketCommunicator(
+            application, '/ws/chat/', headers=[(b'authorization', f'Token {self.receiver_key}'.encode())],
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+    async def test_anonymous_is_closed(self):
+        for path in ('/ws/chat/', '/ws/chat/?token=invalid'):
+            with self.subTest(path=path):
+                communicator = WebsocketCommunicator(application, path)
+                connected, code = await communicator.connect()
+                self.assertFalse(connected)
+                self.assertEqual(code, 4401)
+
+    async def test_new_message_is_pushed_to_receiver(self):
+        communicator = WebsocketCommunicator(application, f'/ws/chat/?token={self.receiver_key}')
+        await communicator.connect()
+        response = await database_sync_to_async(post_message)(self.sender_key, self.receiver.email, 'hello')
+        self.assertEqual(response.status_code, 201)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['message'], 'hello')
+        self.assertEqual(message['sender'], self.sender.email)
+        await communicator.disconnect()
+
+    def test_channel_layer_failure_keeps_message(self):
+        with mock.patch('chat.consumers.get_channel_layer') as get_channel_layer, \
+                self.assertLogs('chat.consumers', level='ERROR'):
+            get_channel_layer.return_value.group_send = mock.AsyncMock(side_effect=ConnectionError)
+            response = post_message(self.sender_key, self.receiver.email, 'hello')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Message.objects.filter(receiver=self.receiver, message='hello').exists())
+
+
+class InboxQueriesTest(APITestCase):
+    def setUp(self):
+        self.user, key = create_user('reader@example.com')
+        self.peer, _ = create_user('peer@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def receive(self, count):
+        Message.objects.bulk_create(Message(sender=self.peer, receiver=self.user, message=f'message {n}')
+                                    for n in range(count))
+
+    def test_constant_queries(self):
+        self.receive(1)
+        self.client.get('/v1/api/chat/messages/')  # resolve and cache the token
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/v1/api/chat/messages/')
+        self.receive(50)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get('/v1/api/chat/messages/')
+        self.assertTrue(response.data['results'])
+        self.assertFalse(Message.objects.filter(id__in=[message['id'] for message in response.data['results']],
+                                                is_received=False).exists())
+
+
+class ConversationTest(APITestCase):
+    def setUp(self):
+        self.user, key = create_user('reader@example.com')
+        self.peer, _ = create_user('peer@example.com')
+        self.other, _ = create_user('other@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        self.start = timezone.now()
+
+    def send(self, sender, receiver, count=1):
+        for n in range(count):
+            message = Message.objects.create(sender=sender, receiver=receiver, message=f'{sender.pk}: {n}')
+            # auto_now_add gives messages created in a burst the same timestamp
+            Message.objects.filter(pk=message.pk).update(
+                timestamp=self.start + timedelta(seconds=Message.objects.count()),
+            )
+
+    def test_non_participant_is_forbidden(self):
+        self.send(self.peer, self.other)
+        response = self.client.get(f'/v1/api/chat/messages/{self.peer.pk}/{self.other.pk}/')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Message.objects.filter(is_received=True).exists())
+
+    def test_cursor_pages(self):
+        self.send(self.peer, self.user, 3)
+        self.send(self.user, self.peer, 3)
+        self.send(self.other, self.user)
+        expected = list(Message.objects.exclude(sender=self.other).order_by('-timestamp', '-id')
+                        .values_list('id', flat=True))
+        first = self.client.get(f'/v1/api/chat/messages/{self.peer.pk}/{self.user.pk}/').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(second['next'])
+        self.assertEqual([message['id'] for message in first['results'] + second['results']], expected)
+
+    def test_marks_received_on_the_read_page_only(self):
+        self.send(self.peer, self.user, 6)
+        self.send(self.user, self.peer)
+        results = self.client.get(f'/v1/api/chat/messages/{self.user.pk}/{self.peer.pk}/').data['results']
+        page = [message['id'] for message in results]
+        received = Message.objects.filter(is_received=True)
+        self.assertEqual(set(received.values_list('id', flat=True)),
+                         set(Message.objects.filter(id__in=page, receiver=self.user).values_list('id', flat=True)))
+        self.assertFalse(received.filter(receiver=self.peer).exists())
+        self.assertEqual(Message.objects.filter(receiver=self.user, is_received=False).count(), 3)
+
+    def test_conversation_list(self):
+        self.send(self.peer, self.user, 3)
+        self.send(self.user, self.peer)
+        self.send(self.other, self.user, 2)
+        self.send(self.peer, self.other)
+        Message.objects.filter(pk=Message.objects.filter(sender=self.other).earliest('id').pk).update(is_received=True)
+        self.client.get('/v1/api/chat/conversations/')  # resolve and cache the token
+        with self.assertNumQueries(1):
+            response = self.client.get('/v1/api/chat/conversations/')
+        self.assertEqual(
+            [(conversation['user'], conversation['last_message'], conversation['unread'])
+             for conversation in response.data],
+            [(self.other.pk, f'{self.other.pk}: 1', 1), (self.peer.pk, f'{self.user.pk}: 0', 3)],
+        )
@@ -2,7 +2,9 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('messages/<int:sender>/<int:receiver>/', views.message_list),
+    path('messages/<int:sender>/<int:receiver>/', views.conversation),
     path('messages/', views.message_list),
+    path('messages/unread/', views.unread_count),
+    path('conversations/', views.conversation_list),
     path('users/', views.user_list),
 ]
\ No newline at end of file
@@ -3,7 +3,14 @@ from account.models import MyUser
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from chat.models import Message
-from chat.serializers import UserSerializer, MessageSerializer
+from chat.pagination import MessageCursorPagination
+from chat.serializers import UserSerializer, MessageSerializer, ConversationSerializer
+
+
+def mark_received(messages, user):
+    Message.objects.filter(
+        id__in=[message.id for message in messages], receiver=user, is_received=False,
+    ).update(is_received=True)
 
 
 @api_view(["GET", ])
@@ -22,13 +29,14 @@ def message_list(request):
 
     if request.method == 'GET':
         sender = request.user
-        messages = Message.objects.filter(Q(sender_id=sender,) | Q(receiver_id=sender,))
+        messages = Message.objects.filter(Q(sender_id=sender,) | Q(receiver_id=sender,)).select_related('sender', 'receiver')
+        paginator = MessageCursorPagination()
+        messages = paginator.paginate_queryset(messages, request)
         serializer = MessageSerializer(messages, many=True, context={'request': request})
+        response = paginator.get_paginated_response(serializer.data)
 
-        for message in messages:
-            message.is_read = True
-            message.save()
-        return Response(serializer.data, )
+        mark_received(messages, sender)
+        return response
 
     elif request.method == 'POST':
         data = request.data
@@ -36,4 +44,31 @@ def message_list(request):
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status=201)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+        return Response(serializer.errors, status=400)
+
+
+@api_view(["GET", ])
+def unread_count(request):
+    count = Message.objects.filter(receiver=request.user, is_received=False).count()
+    return Response({'unread': count})
+
+
+@api_view(["GET", ])
+def conversation(request, sender, receiver):
+    user = request.user
+    if user.id not in (sender, receiver):
+        return Response('You are not a participant of this conversation', status=403)
+    messages = Message.objects.conversation(sender, receiver).select_related('sender', 'receiver')
+    paginator = MessageCursorPagination()
+    messages = paginator.paginate_queryset(messages, request)
+    serializer = MessageSerializer(messages, many=True, context={'request': request})
+    response = paginator.get_paginated_response(serializer.data)
+    mark_received(messages, user)
+    return response
+
+
+@api_view(["GET", ])
+def conversation_list(request):
+    conversations = Message.objects.conversations(request.user)
+    serializer = ConversationSerializer(conversations, many=True)
+    return Response(serializer.data)
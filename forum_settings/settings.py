@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 
@@ -28,10 +29,12 @@ INSTALLED_APPS = [
     'rest_framework',
     'drf_yasg',
     'django_filters',
+    'channels',
 
     'account',
     'main',
     'chat',
+    'benchmarks',
 
 ]
 
@@ -64,6 +67,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'forum_settings.wsgi.application'
+ASGI_APPLICATION = 'forum_settings.asgi.application'
 
 
 
@@ -79,6 +83,11 @@ DATABASES = {
     }
 }
 
+SILENCED_SYSTEM_CHECKS = [
+    # covering indexes (Index.include) are PostgreSQL-only; other backends build them without the extra columns
+    'models.W040',
+]
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -113,6 +122,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# '' streams media from Django; 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+# hand the file to the web server instead
+MEDIA_OFFLOAD = config('MEDIA_OFFLOAD', default='')
+MEDIA_OFFLOAD_PREFIX = config('MEDIA_OFFLOAD_PREFIX', default='/protected-media/')
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -121,7 +134,7 @@ AUTH_USER_MODEL = 'account.MyUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'account.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 4,
@@ -130,10 +143,79 @@ REST_FRAMEWORK = {
     )
 }
 
-CELERY_BROKER_URL = 'redis://localhost:6379'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379'
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+    }
+}
+if config('CACHE_LOCMEM', default='test' in sys.argv, cast=bool):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [REDIS_URL],
+        },
+    }
+}
+if config('CHANNEL_LAYER_INMEMORY', default='test' in sys.argv, cast=bool):
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default='test' in sys.argv, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_BEAT_SCHEDULE = {
+    'drain-mail-queue': {
+        'task': 'account.utils.drain_mail_queue',
+        'schedule': 60.0,
+    },
+    'refresh-hot-posts': {
+        'task': 'main.tasks.refresh_hot_posts',
+        'schedule': 300.0,
+    },
+    'sweep-post-images': {
+        'task': 'main.tasks.sweep_post_images',
+        'schedule': 3600.0,
+    },
+}
+
+QUERY_PROFILING = config('QUERY_PROFILING', default=DEBUG and 'test' not in sys.argv, cast=bool)
+QUERY_PROFILING_MODULES = ('main.views', 'account.views', 'chat.views')
+QUERY_PROFILING_REPEAT_THRESHOLD = 3
+if QUERY_PROFILING:
+    MIDDLEWARE.insert(1, 'main.profiling.QueryProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'main.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+if 'test' in sys.argv:
+    EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
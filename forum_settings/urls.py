@@ -1,10 +1,11 @@
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework.routers import DefaultRouter
 from forum_settings import settings
+from main import async_views
+from main.media import serve_media
 from main.views import ThemeListView, PostsViewSet, PostImageView, CommentViewSet, LikesViewSet, RatingViewSet, \
     FavoriteViewSet, ThemesPageListView, PostsListView
 
@@ -31,10 +32,13 @@ urlpatterns = [
     path('v1/api/themes/', ThemeListView.as_view()),
     path('v1/api/themes/<str:slug>/', ThemesPageListView.as_view()),
     path('v1/api/posts/', PostsListView.as_view()),
+    path('v1/api/async/themes/', async_views.theme_list),
+    path('v1/api/async/posts/', async_views.posts_list),
+    path('v1/api/async/post/', async_views.post_list),
+    path('v1/api/async/post/<int:pk>/', async_views.post_detail),
     path('v1/api/add-image/', PostImageView.as_view()),
     path('v1/api/account/', include('account.urls')),
     path('v1/api/', include(router.urls)),
     path('v1/api/chat/', include('chat.urls')),
-]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+]
\ No newline at end of file
@@ -0,0 +1,140 @@
+import base64
+import math
+from datetime import timedelta
+from functools import wraps
+
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import arender_post_fragments
+from .models import Post, Theme
+from .pagination import PostCursorPagination
+from .serializers import PostListSerializer, PostSerializer, PostsSerializer, ThemeSerializer
+
+PAGE_SIZE = 4
+
+
+async def get_token_user(request):
+    authorization = request.headers.get('Authorization', '').split()
+    if len(authorization) != 2 or authorization[0].lower() != 'token':
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=authorization[1])
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def token_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await get_token_user(request)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def paginate_by_page(request, queryset, page_size=PAGE_SIZE):
+    """Page ``queryset`` like ``PageNumberPagination``; raises ``InvalidPage`` for a bad ``?page=``."""
+    count = await queryset.acount()
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise PageNotAnInteger('That page number is not an integer')
+    # page 1 always exists, even when empty
+    if page < 1 or page > max(math.ceil(count / page_size), 1):
+        raise EmptyPage('That page contains no results')
+    start = (page - 1) * page_size
+    objects = [obj async for obj in queryset[start:start + page_size]]
+    url = request.build_absolute_uri()
+    links = {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if start + page_size < count else None,
+        'previous': None,
+    }
+    if page == 2:
+        links['previous'] = remove_query_param(url, 'page')
+    elif page > 2:
+        links['previous'] = replace_query_param(url, 'page', page - 1)
+    return links, objects
+
+
+def encode_post_cursor(post):
+    position = f'{post.created_at.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_post_cursor(cursor):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return parse_datetime(created_at), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+async def paginate_by_cursor(request, queryset, page_size=PostCursorPagination.page_size):
+    """Forward-only keyset pagination on ``(created_at, id)``, newest first."""
+    queryset = queryset.order_by('-created_at', '-id')
+    position = decode_post_cursor(request.GET.get('cursor', ''))
+    if position and position[0]:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    posts = [post async for post in queryset[:page_size + 1]]
+    next_url = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_post_cursor(posts[-1]))
+    return {'next': next_url, 'previous': None}, posts
+
+
+@require_GET
+async def theme_list(request):
+    try:
+        links, themes = await paginate_by_page(request, Theme.objects.order_by('slug'))
+    except InvalidPage:
+        return JsonResponse({'detail': 'Invalid page.'}, status=404)
+    return JsonResponse({**links, 'results': [ThemeSerializer(theme).data for theme in themes]})
+
+
+@require_GET
+async def posts_list(request):
+    try:
+        links, posts = await paginate_by_page(request, Post.objects.published().order_by('-created_at', '-id'))
+    except InvalidPage:
+        return JsonResponse({'detail': 'Invalid page.'}, status=404)
+    return JsonResponse({**links, 'results': [PostsSerializer(post).data for post in posts]})
+
+
+@require_GET
+@token_required
+async def post_list(request):
+    queryset = Post.objects.published().with_details()
+    try:
+        weeks_count = int(request.GET.get('week', 0))
+        if weeks_count > 0:
+            queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(weeks=weeks_count))
+    except (ValueError, OverflowError):
+        return JsonResponse({'week': 'Expected a whole number of weeks.'}, status=400)
+    links, posts = await paginate_by_cursor(request, queryset)
+    serializer = PostListSerializer(context={'request': request})
+    return JsonResponse({**links, 'results': await arender_post_fragments(serializer, posts)})
+
+
+@require_GET
+@token_required
+async def post_detail(request, pk):
+    try:
+        post = await Post.objects.visible_to(request.user).with_details().aget(pk=pk)
+    except Post.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    serializer = PostSerializer(context={'request': request})
+    data = await arender_post_fragments(serializer, [post])
+    return JsonResponse(data[0])
@@ -0,0 +1,67 @@
+from django.db import connection, transaction
+
+from .models import Favorite, Likes, Post, Rating
+
+
+class BulkWriter:
+    """Set ``value_field`` on the ``owner_field``'s rows for many posts at once.
+
+    Rows are unique per (owner, post), so writes are upserts: concurrent requests
+    for the same pair update one row instead of racing to create duplicates.
+    """
+
+    def __init__(self, model, owner_field, value_field, counters):
+        self.model = model
+        self.owner_field = owner_field
+        self.value_field = value_field
+        self.counters = counters
+
+    def write(self, user, values):
+        """Apply ``{post_id: value}`` for ``user``; return the created and updated row counts.
+
+        The posts are locked first, so concurrent writes to the same posts run one
+        after another, and their counters are recounted from the vote rows rather
+        than moved by deltas that another writer may have applied already. Whatever
+        the batch size, this costs four queries.
+        """
+        with transaction.atomic():
+            list(Post.objects.select_for_update().filter(pk__in=values).order_by('pk').values_list('pk', flat=True))
+            existing = dict(self.model.objects.filter(
+                **{self.owner_field: user, 'post_id__in': values}
+            ).values_list('post_id', self.value_field))
+            changed = [
+                self.model(post_id=post_id, **{self.owner_field: user, self.value_field: value})
+                for post_id, value in values.items() if post_id not in existing or existing[post_id] != value
+            ]
+            self.model.objects.bulk_create(
+                changed, update_conflicts=True,
+                unique_fields=[self.owner_field, 'post'], update_fields=[self.value_field],
+            )
+            if changed:
+                Post.objects.filter(pk__in=[row.post_id for row in changed]).recount(*self.counters)
+        created = len([row for row in changed if row.post_id not in existing])
+        return {'created': created, 'updated': len(changed) - created}
+
+    def toggle(self, user, post_id):
+        """Flip the boolean value for (user, post), creating the row as True, in one statement."""
+        meta = self.model._meta
+        quote = connection.ops.quote_name
+        table = quote(meta.db_table)
+        owner, post, value = (quote(meta.get_field(name).column) for name in (self.owner_field, 'post', self.value_field))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} ({owner}, {post}, {value}) VALUES (%s, %s, %s) '
+                    f'ON CONFLICT ({owner}, {post}) DO UPDATE SET {value} = NOT {table}.{value} '
+                    f'RETURNING {quote(meta.pk.column)}, {value}',
+                    [user.pk, post_id, True],
+                )
+                pk, new = cursor.fetchone()
+            new = bool(new)
+            Post.objects.update_counters(post_id, **{counter: 1 if new else -1 for counter in self.counters})
+        return self.model(pk=pk, post_id=post_id, **{self.owner_field: user, self.value_field: new})
+
+
+likes_writer = BulkWriter(Likes, 'author', 'likes', ('like_count',))
+rating_writer = BulkWriter(Rating, 'author', 'rating', ('rating_sum', 'rating_count'))
+favorite_writer = BulkWriter(Favorite, 'user', 'favorite', ('favorite_count',))
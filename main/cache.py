@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .models import aprefetch_post_details, prefetch_post_details
+
+RESPONSE_CACHE_TIMEOUT = 60 * 15
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+HITS_KEY = 'response-cache:hits'
+MISSES_KEY = 'response-cache:misses'
+
+
+def _version_key(namespace):
+    return f'response-cache:version:{namespace}'
+
+
+def get_version(namespace):
+    return cache.get_or_set(_version_key(namespace), time.time_ns, timeout=None)
+
+
+def bump_version(namespace):
+    cache.set(_version_key(namespace), time.time_ns(), timeout=None)
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    return {'hits': cache.get(HITS_KEY, 0), 'misses': cache.get(MISSES_KEY, 0)}
+
+
+def response_cache_key(request, namespaces):
+    versions = ':'.join(f'{namespace}.{get_version(namespace)}' for namespace in namespaces)
+    params = sorted(request.query_params.lists())
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{params}'
+    return f'response-cache:{versions}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+class CachedListMixin:
+    """Serve ``list`` from the cache for views whose output is the same for every user.
+
+    Keys include the current version of every namespace in ``cache_namespaces``;
+    ``bump_version`` (called from model signals) makes old entries unreachable.
+    """
+    cache_namespaces = ()
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(request, self.cache_namespaces)
+        data = cache.get(key)
+        if data is not None:
+            _increment(HITS_KEY)
+            return Response(data, headers={'X-Cache': 'HIT'})
+        _increment(MISSES_KEY)
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+def post_fragment_key(serializer, post):
+    request = serializer.context.get('request')
+    # image URLs in the fragment are absolute
+    origin = f'{request.scheme}://{request.get_host()}' if request is not None else ''
+    fields = serializer.selected_fields
+    fields = ','.join(sorted(fields)) if fields is not None else '*'
+    return f'post-fragment:{type(serializer).__name__}:{origin}:{fields}:{post.pk}:{post.updated_at.timestamp()}'
+
+
+def render_post_fragments(serializer, posts):
+    """Render ``posts`` with ``serializer.render``, reusing cached fragments.
+
+    Fragments are keyed by ``updated_at``, which every write to a post, its theme
+    or its images, comments, likes and ratings bumps, so stale entries are never read.
+    Relations are only prefetched for the posts that actually need rendering,
+    and only when the serializer's selected fields include them.
+    """
+    keys = [post_fragment_key(serializer, post) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {key: post for key, post in zip(keys, posts) if key not in fragments}
+    if missing:
+        prefetch_post_details(list(missing.values()), serializer.selected_fields)
+        rendered = {key: serializer.render(post) for key, post in missing.items()}
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+    return [fragments[key] for key in keys]
+
+
+async def arender_post_fragments(serializer, posts):
+    keys = [post_fragment_key(serializer, post) for post in posts]
+    fragments = await cache.aget_many(keys)
+    missing = {key: post for key, post in zip(keys, posts) if key not in fragments}
+    if missing:
+        await aprefetch_post_details(list(missing.values()), serializer.selected_fields)
+        rendered = {key: serializer.render(post) for key, post in missing.items()}
+        await cache.aset_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(rendered)
+    return [fragments[key] for key in keys]
@@ -0,0 +1,27 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from main.models import PostImage
+
+
+class Command(BaseCommand):
+    help = 'Move post images stored before content addressing to their digest names and drop duplicate files'
+
+    def handle(self, *args, **options):
+        moved = 0
+        for post_image in PostImage.objects.exclude(image='').exclude(image=None).iterator(chunk_size=500):
+            image = post_image.image
+            old_name = image.name
+            if not image.storage.exists(old_name):
+                continue
+            with image.open('rb') as file:
+                name = image.field.generate_filename(post_image, os.path.basename(old_name))
+                new_name = image.storage.save(name, file)
+            if new_name == old_name:
+                continue
+            PostImage.objects.filter(pk=post_image.pk).update(image=new_name)
+            moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} post images to content-addressed names; run sweep_post_images to delete the old files'
+        ))
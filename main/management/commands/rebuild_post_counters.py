@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized like/comment/favorite/rating counters of every post'
+
+    def handle(self, *args, **options):
+        updated = Post.objects.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} posts'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Post
+from main.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Reindex every post for full-text search'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        count = 0
+        for post in Post.objects.only('id', 'title', 'text').iterator(chunk_size=500):
+            backend.index(post)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} posts with {type(backend).__name__}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from main.tasks import IMAGE_SWEEP_GRACE, sweep_post_images
+
+
+class Command(BaseCommand):
+    help = 'Delete post image and rendition files that no post image references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=IMAGE_SWEEP_GRACE,
+                            help='Keep files written or reused in the last GRACE seconds')
+
+    def handle(self, *args, **options):
+        deleted = sweep_post_images(options['grace'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced image files'))
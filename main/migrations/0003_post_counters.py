@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('main', 'Post')
+
+    def related_total(model_name, aggregate, **filters):
+        model = apps.get_model('main', model_name)
+        rows = model.objects.filter(post=models.OuterRef('pk'), **filters).order_by()
+        rows = rows.values('post').annotate(total=aggregate).values('total')
+        return Coalesce(models.Subquery(rows), 0)
+
+    Post.objects.update(
+        like_count=related_total('Likes', models.Count('pk'), likes=True),
+        comment_count=related_total('Comment', models.Count('pk')),
+        favorite_count=related_total('Favorite', models.Count('pk'), favorite=True),
+        rating_sum=related_total('Rating', models.Sum('rating')),
+        rating_count=related_total('Rating', models.Count('pk')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_auto_20220219_1732'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
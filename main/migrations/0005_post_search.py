@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:22
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def create_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Post = apps.get_model('main', 'Post')
+    Post.objects.update(search_vector=SearchVector('title', weight='A') + SearchVector('text', weight='B'))
+    schema_editor.execute(
+        'CREATE INDEX main_post_search_vector_gin ON main_post USING gin (search_vector)'
+    )
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS main_post_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_post_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='PostSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='main.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'post'], name='main_search_term_post_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_vector_index, drop_search_vector_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='posts/renditions')),
+                ('format', models.CharField(max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('post_image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='main.postimage')),
+            ],
+            options={
+                'ordering': ('width',),
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+import main.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_postimagerendition'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postimage',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=main.storage.ContentAddressedStorage(), upload_to='posts'),
+        ),
+        migrations.AlterField(
+            model_name='postimagerendition',
+            name='image',
+            field=models.ImageField(db_index=True, storage=main.storage.ContentAddressedStorage(), upload_to='posts/renditions'),
+        ),
+    ]
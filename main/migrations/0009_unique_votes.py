@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:37
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def collapse_duplicates(apps, schema_editor):
+    """Keep the newest row of every (owner, post) pair and recount the post counters."""
+    for model_name, owner in (('Likes', 'author'), ('Rating', 'author'), ('Favorite', 'user')):
+        model = apps.get_model('main', model_name)
+        duplicates = (model.objects.filter(**{f'{owner}__isnull': False}).order_by()
+                      .values(owner, 'post').annotate(rows=models.Count('pk'), keep=models.Max('pk'))
+                      .filter(rows__gt=1))
+        for group in duplicates.iterator():
+            model.objects.filter(**{owner: group[owner], 'post': group['post']}).exclude(pk=group['keep']).delete()
+
+    Post = apps.get_model('main', 'Post')
+
+    def related_total(model_name, aggregate, **filters):
+        model = apps.get_model('main', model_name)
+        rows = model.objects.filter(post=models.OuterRef('pk'), **filters).order_by()
+        rows = rows.values('post').annotate(total=aggregate).values('total')
+        return Coalesce(models.Subquery(rows), 0)
+
+    Post.objects.update(
+        like_count=related_total('Likes', models.Count('pk'), likes=True),
+        favorite_count=related_total('Favorite', models.Count('pk'), favorite=True),
+        rating_sum=related_total('Rating', models.Sum('rating')),
+        rating_count=related_total('Rating', models.Count('pk')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_post_image_content_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='main_favorite_user_post_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='likes',
+            constraint=models.UniqueConstraint(fields=('author', 'post'), name='main_likes_author_post_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('author', 'post'), name='main_rating_author_post_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_unique_votes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('published', 'Published'), ('archived', 'Archived')], default='published', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['theme', 'status', '-created_at', '-id'], include=('title',), name='main_post_theme_status_idx'),
+        ),
+    ]
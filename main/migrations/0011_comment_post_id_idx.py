@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_post_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'id'], name='main_comment_post_id_idx'),
+        ),
+    ]
@@ -1,6 +1,11 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from account.models import MyUser
 
+from .storage import ContentAddressedStorage
+
 
 class Theme(models.Model):
     slug = models.SlugField(max_length=100, primary_key=True)
@@ -11,27 +16,168 @@ class Theme(models.Model):
         return self.name
 
 
+def _related_total(model, aggregate, **filters):
+    rows = model.objects.filter(post=models.OuterRef('pk'), **filters).order_by()
+    rows = rows.values('post').annotate(total=aggregate).values('total')
+    return Coalesce(models.Subquery(rows), 0)
+
+
+def _counter_totals():
+    return {
+        'like_count': _related_total(Likes, models.Count('pk'), likes=True),
+        'comment_count': _related_total(Comment, models.Count('pk')),
+        'favorite_count': _related_total(Favorite, models.Count('pk'), favorite=True),
+        'rating_sum': _related_total(Rating, models.Sum('rating')),
+        'rating_count': _related_total(Rating, models.Count('pk')),
+    }
+
+
+LATEST_COMMENTS = 3
+
+
+def post_detail_lookups(fields=None):
+    """Prefetches for a post's nested relations, limited to ``fields`` when given.
+
+    Only the latest ``LATEST_COMMENTS`` comments of each post are embedded; Django
+    fetches them for the whole page with one ROW_NUMBER() window query.
+    """
+    comments = Comment.objects.select_related('author').order_by('-id')[:LATEST_COMMENTS]
+    lookups = {
+        'images': 'images__renditions',
+        'comments': models.Prefetch('comments', queryset=comments, to_attr='latest_comments'),
+    }
+    return [lookup for name, lookup in lookups.items() if fields is None or name in fields]
+
+
+def prefetch_post_details(posts, fields=None):
+    models.prefetch_related_objects(posts, *post_detail_lookups(fields))
+
+
+async def aprefetch_post_details(posts, fields=None):
+    await models.aprefetch_related_objects(posts, *post_detail_lookups(fields))
+
+
+class PostQuerySet(models.QuerySet):
+    def with_details(self):
+        return self.select_related('author', 'theme')
+
+    def published(self):
+        return self.filter(status=Post.Status.PUBLISHED)
+
+    def visible_to(self, user):
+        """Published posts plus the user's own drafts and archived posts."""
+        if not user.is_authenticated:
+            return self.published()
+        return self.filter(models.Q(status=Post.Status.PUBLISHED) | models.Q(author=user))
+
+    def update_counters(self, pk, **deltas):
+        changes = {name: models.F(name) + delta for name, delta in deltas.items() if delta}
+        if changes:
+            self.filter(pk=pk).update(updated_at=timezone.now(), **changes)
+
+    def touch(self, pk):
+        self.filter(pk=pk).update(updated_at=timezone.now())
+
+    def recount(self, *counters):
+        """Recompute ``counters`` from the vote rows and mark the posts as changed."""
+        totals = _counter_totals()
+        return self.update(updated_at=timezone.now(), **{name: totals[name] for name in counters})
+
+    def rebuild_counters(self):
+        return self.recount(*_counter_totals())
+
+
+def with_visible_posts(queryset, user):
+    """Rows of ``queryset`` whose post ``user`` may see, as ``PostQuerySet.visible_to`` defines it."""
+    if not user.is_authenticated:
+        return queryset.filter(post__status=Post.Status.PUBLISHED)
+    return queryset.filter(models.Q(post__status=Post.Status.PUBLISHED) | models.Q(post__author=user))
+
+
 class Post(models.Model):
+    class Status(models.TextChoices):
+        DRAFT = 'draft', 'Draft'
+        PUBLISHED = 'published', 'Published'
+        ARCHIVED = 'archived', 'Archived'
+
+    # statuses a post may move to from each status
+    TRANSITIONS = {
+        Status.DRAFT: {Status.PUBLISHED},
+        Status.PUBLISHED: {Status.ARCHIVED},
+        Status.ARCHIVED: {Status.PUBLISHED},
+    }
+
     author = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='posts')
     theme = models.ForeignKey(Theme, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=200)
     text = models.TextField()
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PUBLISHED)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    favorite_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='main_post_created_id_idx'),
+            # theme pages: the title is included so listings are served by index-only scans
+            models.Index(fields=['theme', 'status', '-created_at', '-id'], include=['title'],
+                         name='main_post_theme_status_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def rating_avg(self):
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+
+class PostSearchTerm(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'], name='main_search_term_post_idx'),
+        ]
+
 
 class PostImage(models.Model):
-    image = models.ImageField(upload_to='posts', blank=True, null=True)
+    image = models.ImageField(upload_to='posts', storage=ContentAddressedStorage(), blank=True, null=True, db_index=True)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
 
 
+class PostImageRendition(models.Model):
+    post_image = models.ForeignKey(PostImage, on_delete=models.CASCADE, related_name='renditions')
+    image = models.ImageField(upload_to='posts/renditions', storage=ContentAddressedStorage(), db_index=True)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ('width',)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     text = models.TextField()
     author = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='comments')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'id'], name='main_comment_post_id_idx'),
+        ]
+
     def __str__(self):
         return f'{self.author}:{self.text}'
 
@@ -41,6 +187,11 @@ class Likes(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
     author = models.ForeignKey(MyUser, on_delete=models.CASCADE, related_name='likes')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'post'], name='main_likes_author_post_uniq'),
+        ]
+
     def __str__(self):
         return str(self.likes)
 
@@ -56,9 +207,19 @@ class Rating(models.Model):
     )
     rating = models.PositiveIntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['author', 'post'], name='main_rating_author_post_uniq'),
+        ]
+
 
 class Favorite(models.Model):
     user = models.ForeignKey('account.MyUser', on_delete=models.CASCADE, related_name='favorites')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='favorites')
     favorite = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='main_favorite_user_post_uniq'),
+        ]
+
@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PostCursorPagination(CursorPagination):
+    page_size = 3
+    ordering = ('-created_at', '-id')
+
+
+class ThemePageCursorPagination(CursorPagination):
+    page_size = 3
+    ordering = ('-created_at', '-id')
+
+
+class CommentCursorPagination(CursorPagination):
+    ordering = ('-id',)
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 3
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?|\d+)\s*,?)+\)', re.IGNORECASE)
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SPACE_RE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Reduce ``sql`` to its shape: literals and IN lists become placeholders."""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = LITERAL_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+class QueryProfile:
+    """``connection.execute_wrapper`` hook recording every query run while it is installed."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in connections:
+            self._stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold=None):
+        """Query shapes run at least ``threshold`` times: the usual sign of an N+1."""
+        threshold = threshold or settings.QUERY_PROFILING_REPEAT_THRESHOLD
+        shapes = Counter(normalize(sql) for sql, _ in self.queries)
+        return {fingerprint(sql): {'count': count, 'sql': sql}
+                for sql, count in shapes.items() if count >= threshold}
+
+
+def get_view_name(view_func):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return view_class.__module__, view_class.__name__
+    return view_func.__module__, view_func.__qualname__
+
+
+class QueryProfilingMiddleware:
+    """Report the queries of views in ``QUERY_PROFILING_MODULES`` as a
+    ``Server-Timing`` header and a structured ``main.profiling`` log record.
+
+    The middleware runs natively in both modes, so under ASGI it adds no thread
+    hop around the async views; it is only installed when ``QUERY_PROFILING`` is on.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.QUERY_PROFILING:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with QueryProfile() as profile:
+            response = self.get_response(request)
+        return self.report(request, response, profile, started)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_PROFILING:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        profile = QueryProfile()
+        # connections are per thread: install the wrapper on the thread-sensitive
+        # executor that runs this request's ORM calls and sync views
+        await sync_to_async(profile.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(profile.__exit__)(None, None, None)
+        return self.report(request, response, profile, started)
+
+    def report(self, request, response, profile, started):
+        view = getattr(request, '_profiled_view', None)
+        if view is None:
+            return response
+        total = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;desc="{profile.count} queries";dur={profile.duration * 1000:.2f}, app;dur={total * 1000:.2f}'
+        )
+        repeated = profile.repeated()
+        record = {
+            'view': view,
+            'action': getattr(request, '_profiled_action', None),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_ms': round(profile.duration * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'repeated': repeated,
+        }
+        logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(record), extra={'profile': record})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        module, name = get_view_name(view_func)
+        if module in settings.QUERY_PROFILING_MODULES:
+            request._profiled_view = f'{module}.{name}'
+            actions = getattr(view_func, 'actions', None) or {}
+            request._profiled_action = actions.get(request.method.lower())
+
+
+class QueryBudget(ContextDecorator):
+    """Fail when the wrapped block runs more than ``max_queries`` queries::
+
+        with QueryBudget(4):
+            client.get('/v1/api/rating/')
+
+    Repeated query shapes are listed in the error to point at the N+1.
+    """
+
+    def __init__(self, max_queries):
+        self.max_queries = max_queries
+
+    def __enter__(self):
+        self.profile = QueryProfile().__enter__()
+        return self.profile
+
+    def __exit__(self, exc_type, *exc_info):
+        self.profile.__exit__(exc_type, *exc_info)
+        if exc_type is None and self.profile.count > self.max_queries:
+            repeated = '\n'.join(f'  {shape["count"]}x {shape["sql"]}'
+                                 for shape in self.profile.repeated(threshold=2).values())
+            raise AssertionError(
+                f'{self.profile.count} queries executed, budget is {self.max_queries}'
+                + (f'\nRepeated queries:\n{repeated}' if repeated else '')
+            )
+        return False
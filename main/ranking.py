@@ -0,0 +1,120 @@
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Post
+
+HOT_POSTS_LIMIT = 20
+HOT_POSTS_TIMEOUT = 60 * 30
+HOT_BATCH_SIZE = 5000
+ALL_THEMES = '*'
+HOT_INDEX_KEY = 'hot-posts-index'
+
+# weight of one like / comment / favorite / rating point in a post's engagement
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+FAVORITE_WEIGHT = 3.0
+RATING_WEIGHT = 0.5
+GRAVITY = 1.8
+
+FIELDS = ('id', 'theme_id', 'title', 'created_at', 'like_count', 'comment_count',
+          'favorite_count', 'rating_sum')
+
+
+def hot_key(theme=ALL_THEMES):
+    return f'hot-posts:{theme}'
+
+
+def hot_scores(likes, comments, favorites, rating_sum, age_hours):
+    """Time-decayed engagement: ``engagement / (age + 2) ** GRAVITY`` for arrays of posts."""
+    engagement = (LIKE_WEIGHT * likes + COMMENT_WEIGHT * comments + FAVORITE_WEIGHT * favorites
+                  + RATING_WEIGHT * rating_sum)
+    return engagement / np.power(age_hours + 2, GRAVITY)
+
+
+def top(scores, limit):
+    """Indices of the ``limit`` highest scores, best first."""
+    if len(scores) > limit:
+        candidates = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def group_top(groups, scores, limit):
+    """Indices of the ``limit`` highest scores of every group, grouped and best first."""
+    _, codes = np.unique(groups, return_inverse=True)
+    order = np.lexsort((-scores, codes))
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[ranks < limit]
+
+
+def iter_batches(queryset, size):
+    batch = []
+    for row in queryset.values_list(*FIELDS).iterator(chunk_size=size):
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_batch(batch, now):
+    """Turn a batch of rows into ``{field: array}`` columns plus a ``score`` column."""
+    columns = {name: np.asarray(column) for name, column in zip(FIELDS, zip(*batch))}
+    created = np.fromiter((created_at.timestamp() for created_at in columns['created_at']),
+                          dtype=float, count=len(batch))
+    age_hours = np.maximum(now.timestamp() - created, 0) / 3600
+    counters = (columns[name].astype(float) for name in ('like_count', 'comment_count', 'favorite_count', 'rating_sum'))
+    columns['score'] = hot_scores(*counters, age_hours)
+    return columns
+
+
+def rank_hot_posts(queryset=None, limit=HOT_POSTS_LIMIT, batch_size=HOT_BATCH_SIZE):
+    """Score every post and cache the top ``limit`` overall and per theme.
+
+    Rows are scored a batch at a time; only the running top ``limit`` of each
+    theme is kept between batches, as columns, so memory stays bounded by the
+    batch size. The overall leaders are always among the theme leaders.
+    """
+    if queryset is None:
+        queryset = Post.objects.published()
+    now = timezone.now()
+    leaders = None
+    for batch in iter_batches(queryset.order_by(), batch_size):
+        columns = score_batch(batch, now)
+        if leaders is not None:
+            columns = {name: np.concatenate((leaders[name], column)) for name, column in columns.items()}
+        best = group_top(columns['theme_id'], columns['score'], limit)
+        leaders = {name: column[best] for name, column in columns.items()}
+
+    entries = {}
+    if leaders is not None:
+        entries[hot_key()] = [hot_entry(leaders, index) for index in top(leaders['score'], limit)]
+        # group_top returns every theme's leaders contiguously, in np.unique order
+        themes, starts, counts = np.unique(leaders['theme_id'], return_index=True, return_counts=True)
+        for theme, start, count in zip(themes, starts, counts):
+            entries[hot_key(theme)] = [hot_entry(leaders, index) for index in range(start, start + count)]
+    stale = set(cache.get(HOT_INDEX_KEY, [])) - set(entries)
+    cache.set_many({**entries, HOT_INDEX_KEY: list(entries)}, timeout=HOT_POSTS_TIMEOUT)
+    cache.delete_many(list(stale))
+    return len(entries)
+
+
+def hot_entry(leaders, index):
+    return {
+        'id': int(leaders['id'][index]),
+        'title': str(leaders['title'][index]),
+        'theme': str(leaders['theme_id'][index]),
+        'created_at': timezone.localtime(leaders['created_at'][index]).strftime('%d/%m/%Y %H:%M:%S'),
+        'likes': int(leaders['like_count'][index]),
+        'comments': int(leaders['comment_count'][index]),
+        'score': round(float(leaders['score'][index]), 6),
+    }
+
+
+def get_hot_posts(theme=None):
+    return cache.get(hot_key(theme or ALL_THEMES), [])
@@ -0,0 +1,79 @@
+import re
+from collections import Counter
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+
+from .models import Post, PostSearchTerm
+
+TITLE_WEIGHT = 3
+TEXT_WEIGHT = 1
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    max_length = PostSearchTerm._meta.get_field('term').max_length
+    return [token[:max_length] for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+class PostgresSearchBackend:
+    """Ranked search over the stored, GIN-indexed ``Post.search_vector``."""
+
+    def index(self, post):
+        vector = SearchVector('title', weight='A') + SearchVector('text', weight='B')
+        Post.objects.filter(pk=post.pk).update(search_vector=vector)
+
+    def search(self, queryset, query):
+        query = SearchQuery(query, search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        return queryset.annotate(rank=SearchRank(F('search_vector'), query)).order_by('-rank', '-id')
+
+
+class InvertedIndexSearchBackend:
+    """Fallback for databases without full-text search (SQLite, tests).
+
+    Every post is tokenized in Python into weighted ``PostSearchTerm`` rows;
+    a query matches posts containing every query token as a term prefix and
+    ranks them by the summed weight of the matching terms.
+    """
+
+    def index(self, post):
+        weights = Counter()
+        for token in tokenize(post.title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(post.text):
+            weights[token] += TEXT_WEIGHT
+        with transaction.atomic():
+            PostSearchTerm.objects.filter(post=post).delete()
+            PostSearchTerm.objects.bulk_create(
+                PostSearchTerm(post=post, term=term, weight=weight) for term, weight in weights.items()
+            )
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        terms = PostSearchTerm.objects.filter(post=OuterRef('pk'))
+        for token in tokens:
+            queryset = queryset.filter(Exists(terms.filter(term__startswith=token)))
+        matching = Q()
+        for token in tokens:
+            matching |= Q(term__startswith=token)
+        rank = terms.filter(matching).order_by().values('post').annotate(total=Sum('weight')).values('total')
+        return queryset.annotate(rank=Subquery(rank)).order_by('-rank', '-id')
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
+
+
+def search_posts(queryset, query):
+    return get_backend().search(queryset, query)
+
+
+def index_post(post):
+    get_backend().index(post)
@@ -1,6 +1,70 @@
-from django.db.models import Avg
+from django.db import transaction
+from django.db.models.manager import BaseManager
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from .bulk import likes_writer
+from .cache import render_post_fragments
 from .models import *
+from .storage import content_digest, stored_digest
+from .tasks import process_post_image
+
+
+def _split_fields(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Lets readers pick fields with ``?fields=id,title``, plus ``&expand=comments``
+    for relations, instead of always getting the full representation.
+
+    ``field_columns`` maps every output field to the model columns it reads, so
+    views can narrow their queryset with ``narrow_queryset``; ``field_relations``
+    names the ``select_related`` join a field needs.
+    """
+    field_columns = {}
+    field_relations = {}
+    required_columns = ('id',)
+
+    @classmethod
+    def requested_fields(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        params = getattr(request, 'query_params', request.GET)
+        if 'fields' not in params:
+            return None
+        fields = _split_fields(params['fields']) | _split_fields(params.get('expand', ''))
+        return frozenset(fields & set(cls.field_columns))
+
+    @classmethod
+    def narrow_queryset(cls, queryset, request):
+        fields = cls.requested_fields(request)
+        if fields is None:
+            return queryset
+        columns = set(cls.required_columns).union(*(cls.field_columns[name] for name in fields))
+        relations = {cls.field_relations[name] for name in fields if name in cls.field_relations}
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
+
+    @property
+    def selected_fields(self):
+        return self.requested_fields(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.selected_fields
+        if selected is not None:
+            for name in set(fields) - selected:
+                del fields[name]
+        return fields
+
+
+class VisiblePostField(serializers.PrimaryKeyRelatedField):
+    """A post pk limited to the posts the requesting user can see, so other users' drafts can't be written to."""
+
+    def get_queryset(self):
+        return Post.objects.visible_to(self.context['request'].user)
 
 
 class ThemeSerializer(serializers.ModelSerializer):
@@ -15,33 +79,87 @@ class ThemesPageSerializer(serializers.ModelSerializer):
         fields = ('id', 'title')
 
 
-class PostsSerializer(serializers.ModelSerializer):
+class PostsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format='%d/%m/%Y %H:%M:%S', read_only=True)
+    field_columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'theme': ('theme',),
+        'created_at': ('created_at',),
+    }
+    required_columns = ('id', 'created_at')
 
     class Meta:
         model = Post
         fields = ('id', 'title', 'theme', 'created_at')
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostFragmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = data.all() if isinstance(data, BaseManager) else data
+        return render_post_fragments(self.child, list(posts))
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format='%d/%m/%Y %H:%M:%S', read_only=True)
+    field_columns = {
+        'id': ('id',),
+        'title': ('title',),
+        'theme': ('theme__slug', 'theme__name'),
+        'created_at': ('created_at',),
+        'text': ('text',),
+        'status': ('status',),
+        'author': ('author__email',),
+        'images': (),
+        'comments': (),
+        'comment_count': ('comment_count',),
+        'likes': ('like_count',),
+        'rating': ('rating_sum', 'rating_count'),
+    }
+    field_relations = {'theme': 'theme', 'author': 'author'}
+    # created_at orders the cursor pagination, updated_at keys the fragment cache
+    required_columns = ('id', 'created_at', 'updated_at')
 
     class Meta:
         model = Post
-        fields = ('id', 'title', 'theme', 'created_at', 'text')
+        fields = ('id', 'title', 'theme', 'created_at', 'text', 'status')
+        list_serializer_class = PostFragmentListSerializer
+
+    def validate_status(self, status):
+        if self.instance is not None and status != self.instance.status \
+                and status not in Post.TRANSITIONS[self.instance.status]:
+            raise serializers.ValidationError(
+                f'Status can not change from {self.instance.status} to {status}.'
+            )
+        return status
 
     def to_representation(self, instance):
+        return render_post_fragments(self, [instance])[0]
+
+    def render(self, instance):
+        selected = self.selected_fields
         representation = super().to_representation(instance)
-        representation['author'] = instance.author.email
-        representation['theme'] = ThemeSerializer(instance.theme).data
-        representation['images'] = PostImageSerializer(instance.images.all(),
-                                                       many=True, context=self.context).data
-        representation['comments'] = CommentSerializer(instance.comments.all(),
-                                                       many=True).data
-        representation['likes'] = instance.likes.all().count()
-        representation['rating'] = instance.rating.aggregate(Avg('rating')).get("rating_avg")
+        extra = {
+            'author': lambda: instance.author.email,
+            'theme': lambda: ThemeSerializer(instance.theme).data,
+            'images': lambda: PostImageSerializer(instance.images.all(), many=True, context=self.context).data,
+            'comments': lambda: CommentSerializer(self._latest_comments(instance), many=True).data,
+            'comment_count': lambda: instance.comment_count,
+            'likes': lambda: instance.like_count,
+            'rating': lambda: instance.rating_avg,
+        }
+        for name, value in extra.items():
+            if selected is None or name in selected:
+                representation[name] = value()
         return representation
 
+    @staticmethod
+    def _latest_comments(instance):
+        comments = getattr(instance, 'latest_comments', None)
+        if comments is None:
+            comments = instance.comments.select_related('author').order_by('-id')[:LATEST_COMMENTS]
+        return comments
+
     def create(self, validated_data):
         request = self.context.get('request')
         user_id = request.user.id
@@ -53,36 +171,106 @@ class PostSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         for key, value in validated_data.items():
             setattr(instance, key, value)
-        images_data = request.FILES
-        instance.images.all().delete()
-        for image in images_data.getlist('images'):
-            PostImage.objects.create(image=image, post=instance)
+        uploads = request.FILES.getlist('images')
+        keep_ids = self._get_image_ids(request.data)
+        with transaction.atomic():
+            instance.save()
+            if uploads or keep_ids is not None:
+                self._update_images(instance, uploads, keep_ids or set())
         return instance
 
+    @staticmethod
+    def _get_image_ids(data):
+        if 'image_ids' not in data:
+            return None
+        # a JSON string would otherwise be iterated character by character
+        ids = data.getlist('image_ids') if hasattr(data, 'getlist') else data['image_ids']
+        if not isinstance(ids, (list, tuple)):
+            raise serializers.ValidationError({'image_ids': 'A list of image ids is expected.'})
+        try:
+            return {int(pk) for pk in ids}
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'image_ids': 'A list of image ids is expected.'})
+
+    def _update_images(self, instance, uploads, keep_ids):
+        """Keep images listed in ``keep_ids`` or re-uploaded unchanged, add new ones and drop the rest."""
+        existing = {stored_digest(image): pk
+                    for pk, image in instance.images.values_list('pk', 'image') if image}
+        new_images = []
+        for upload in uploads:
+            digest = content_digest(upload)
+            if digest in existing:
+                keep_ids.add(existing[digest])
+            else:
+                existing[digest] = None
+                new_images.append(PostImage(post=instance, image=upload))
+        instance.images.exclude(pk__in=keep_ids).delete()
+        created = PostImage.objects.bulk_create(new_images)
+        # bulk_create sends no post_save, so schedule the renditions here
+        for image in created:
+            transaction.on_commit(lambda pk=image.pk: process_post_image.delay(pk))
+
+
+class TextPreviewField(serializers.CharField):
+    def __init__(self, length=15, **kwargs):
+        self.length = length
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        value = super().to_representation(value)
+        if len(value) <= self.length:
+            return value
+        return value[:self.length] + '...'
+
+
+class PostListSerializer(PostSerializer):
+    text = TextPreviewField(read_only=True)
+
 
 class PostImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostImage
         fields = '__all__'
 
+    def _get_file_url(self, file):
+        url = file.url
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return url
+
     def _get_image_url(self, obj):
         if obj.image:
-            url = obj.image.url
-            request = self.context.get('request')
-            if request is not None:
-                url = request.build_absolute_uri(url)
+            url = self._get_file_url(obj.image)
         else:
             url = ''
         return url
 
+    def _get_srcset(self, obj):
+        srcset = {}
+        for rendition in obj.renditions.all():
+            srcset.setdefault(rendition.format, []).append(
+                f'{self._get_file_url(rendition.image)} {rendition.width}w'
+            )
+        return {image_format: ', '.join(sources) for image_format, sources in srcset.items()}
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['image'] = self._get_image_url(instance)
+        representation['srcset'] = self._get_srcset(instance)
         return representation
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.email')
+    post = VisiblePostField()
+    field_columns = {
+        'id': ('id',),
+        'text': ('text',),
+        'post': ('post',),
+        'author': ('author__email',),
+    }
+    field_relations = {'author': 'author'}
 
     class Meta:
         model = Comment
@@ -90,14 +278,32 @@ class CommentSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         request = self.context.get('request')
-        comment = Comment.objects.create(author=request.user, **validated_data)
+        with transaction.atomic():
+            comment = Comment.objects.create(author=request.user, **validated_data)
+            Post.objects.update_counters(comment.post_id, comment_count=1)
         return comment
 
 
 
-class LikesSerializer(serializers.ModelSerializer):
+class SingleVoteMixin:
+    """Reject moving a vote onto a post its author has already voted on.
+
+    The author is not a writable field, so DRF adds no validator for the
+    (author, post) unique constraint by itself.
+    """
+
+    def validate_post(self, post):
+        vote = self.instance
+        if vote is not None and post.pk != vote.post_id \
+                and type(vote).objects.filter(author_id=vote.author_id, post=post).exists():
+            raise serializers.ValidationError('You have already voted on this post.')
+        return post
+
+
+class LikesSerializer(SingleVoteMixin, serializers.ModelSerializer):
 
     author = serializers.ReadOnlyField(source='author.email')
+    post = VisiblePostField()
 
     class Meta:
         model = Likes
@@ -107,14 +313,12 @@ class LikesSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         author = request.user
         post = validated_data.get('post')
-        like = Likes.objects.get_or_create(author=author, post=post)[0]
-        like.likes = True if like.likes is False else False
-        like.save()
-        return like
+        return likes_writer.toggle(author, post.pk)
 
 
-class RatingSerializer(serializers.ModelSerializer):
+class RatingSerializer(SingleVoteMixin, serializers.ModelSerializer):
     post_title = serializers.SerializerMethodField("get_post_title")
+    post = VisiblePostField()
 
     class Meta:
         model = Rating
@@ -141,6 +345,8 @@ class RatingSerializer(serializers.ModelSerializer):
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    post = VisiblePostField()
+
     class Meta:
         model = Favorite
         fields = '__all__'
@@ -148,4 +354,30 @@ class FavoriteSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['post'] = instance.post.title
-        return representation
\ No newline at end of file
+        return representation
+
+
+class BulkValueListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        values = {item['post']: item['value'] for item in attrs}
+        posts = Post.objects.visible_to(self.context['request'].user).filter(pk__in=values)
+        missing = set(values) - set(posts.values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f'Unknown posts: {sorted(missing)}')
+        return values
+
+
+class BulkLikesSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1)
+    value = serializers.BooleanField()
+
+    class Meta:
+        list_serializer_class = BulkValueListSerializer
+
+
+class BulkRatingSerializer(BulkLikesSerializer):
+    value = serializers.IntegerField(min_value=1, max_value=5)
+
+
+class BulkFavoriteSerializer(BulkLikesSerializer):
+    pass
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_version
+from .models import Comment, Likes, Post, PostImage, Rating, Theme
+from .search import index_post
+from .tasks import process_post_image
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'title', 'text'} & set(update_fields):
+        return
+    index_post(instance)
+
+
+@receiver([post_save, post_delete], sender=Theme)
+def invalidate_theme_responses(sender, **kwargs):
+    bump_version('theme')
+
+
+@receiver(post_save, sender=Theme)
+def touch_theme_posts(sender, instance, **kwargs):
+    # post fragments embed the theme's name
+    Post.objects.filter(theme=instance).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_responses(sender, **kwargs):
+    bump_version('post')
+
+
+# saves only: a post_delete receiver would stop Django from fast-deleting these
+# rows when a post is deleted, and touch the post once per cascaded row. The
+# delete paths move the post's counters, which bumps updated_at anyway.
+@receiver(post_save, sender=PostImage)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Likes)
+@receiver(post_save, sender=Rating)
+def touch_post(sender, instance, **kwargs):
+    Post.objects.touch(instance.post_id)
+
+
+@receiver(post_save, sender=PostImage)
+def schedule_image_processing(sender, instance, created, **kwargs):
+    if created and instance.image:
+        transaction.on_commit(lambda: process_post_image.delay(instance.pk))
+
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Store every file once, under the SHA-256 digest of its content.
+
+    The upload is hashed while it is streamed to a temporary file, which is then
+    moved to ``<upload_to>/<aa>/<digest><ext>``. Saving content that is already
+    stored only drops the temporary file, touches the stored one and returns its
+    name. Files are only ever deleted by ``sweep``.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+
+        os.makedirs(self.location, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.location, suffix='.part')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            path = self.path(name)
+            if self.exists(name):
+                os.remove(temp_path)
+                # a reused blob must not look stale to a concurrent sweep
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                file_move_safe(temp_path, path, allow_overwrite=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
+
+
+def content_digest(content):
+    """Return the SHA-256 hex digest a file would be stored under."""
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def stored_digest(name):
+    return os.path.splitext(posixpath.basename(name))[0]
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from walk(storage, posixpath.join(directory, subdirectory))
+
+
+def modified_before(storage, name, cutoff):
+    try:
+        return os.path.getmtime(storage.path(name)) < cutoff
+    except FileNotFoundError:
+        return False
+
+
+def sweep(storage, directory, referenced, grace, batch_size=500):
+    """Delete the files under ``directory`` that no row references any more.
+
+    ``referenced(names)`` returns the names still in use. Files written or reused
+    in the last ``grace`` seconds are kept, as the upload that saved them may not
+    have committed its row yet. Returns the number of deleted files.
+    """
+    if not storage.exists(directory):
+        return 0
+    cutoff = time.time() - grace
+    candidates = (name for name in walk(storage, directory) if modified_before(storage, name, cutoff))
+    deleted = 0
+    while batch := list(islice(candidates, batch_size)):
+        for name in set(batch) - set(referenced(batch)):
+            # checked again right before deleting, in case an upload reused it meanwhile
+            if modified_before(storage, name, cutoff):
+                storage.delete(name)
+                deleted += 1
+    return deleted
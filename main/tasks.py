@@ -0,0 +1,93 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from forum_settings.celery_ import app
+from .models import Post, PostImage, PostImageRendition
+from .ranking import rank_hot_posts
+from .storage import sweep
+
+RENDITION_WIDTHS = (320, 640, 1280)
+# an upload's row is committed well within this many seconds of its file being saved
+IMAGE_SWEEP_GRACE = 60 * 60
+RENDITION_FORMATS = (
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+)
+
+
+def render_renditions(source, name):
+    """Yield unsaved renditions of ``source`` for every width not larger than the original."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    widths = [width for width in RENDITION_WIDTHS if width < source.width] or [source.width]
+    for width in widths:
+        resized = source.copy()
+        resized.thumbnail((width, source.height), Image.LANCZOS)
+        for image_format, pil_format, options in RENDITION_FORMATS:
+            image = resized.convert('RGB') if pil_format == 'JPEG' else resized
+            buffer = BytesIO()
+            # saving without exif= drops EXIF and other metadata
+            image.save(buffer, pil_format, **options)
+            rendition = PostImageRendition(format=image_format, width=resized.width, height=resized.height)
+            rendition.image.save(f'{stem}_{resized.width}.{image_format}', ContentFile(buffer.getvalue()), save=False)
+            yield rendition
+
+
+def stored_renditions(post_image):
+    """Return copies of the renditions already made for another upload of the same blob."""
+    other = PostImageRendition.objects.filter(post_image__image=post_image.image.name).exclude(
+        post_image=post_image
+    ).values_list('post_image_id', flat=True).first()
+    if other is None:
+        return []
+    return [
+        PostImageRendition(image=rendition.image.name, format=rendition.format,
+                           width=rendition.width, height=rendition.height)
+        for rendition in PostImageRendition.objects.filter(post_image_id=other)
+    ]
+
+
+@app.task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def process_post_image(post_image_id):
+    post_image = PostImage.objects.filter(pk=post_image_id).first()
+    if post_image is None or not post_image.image:
+        return
+    renditions = stored_renditions(post_image)
+    if not renditions:
+        try:
+            with post_image.image.open('rb') as file:
+                source = ImageOps.exif_transpose(Image.open(file))
+                source.load()
+        except UnidentifiedImageError:
+            # an OSError too, but retrying will not make the upload an image
+            return
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+        renditions = list(render_renditions(source, post_image.image.name))
+    for rendition in renditions:
+        rendition.post_image = post_image
+    with transaction.atomic():
+        post_image.renditions.all().delete()
+        PostImageRendition.objects.bulk_create(renditions)
+        Post.objects.touch(post_image.post_id)
+
+
+@app.task
+def refresh_hot_posts():
+    return rank_hot_posts()
+
+
+def referenced_images(names):
+    return set(PostImage.objects.filter(image__in=names).values_list('image', flat=True)).union(
+        PostImageRendition.objects.filter(image__in=names).values_list('image', flat=True)
+    )
+
+
+@app.task
+def sweep_post_images(grace=IMAGE_SWEEP_GRACE):
+    """Delete image and rendition blobs that no post image references any more."""
+    storage = PostImage._meta.get_field('image').storage
+    return sweep(storage, 'posts', referenced_images, grace)
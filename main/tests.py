@@ -1,3 +1,707 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from account.models import MyUser
+from .models import (
+    LATEST_COMMENTS, Comment, Favorite, Likes, Post, PostImage, PostImageRendition, PostSearchTerm, Rating, Theme,
+)
+from .cache import get_stats
+from .media import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from .pagination import PostCursorPagination
+from .profiling import QueryBudget, QueryProfilingMiddleware
+from .ranking import get_hot_posts, rank_hot_posts
+from .tasks import IMAGE_SWEEP_GRACE, process_post_image, sweep_post_images
+
+
+class ForumTestCase(APITestCase):
+    rows = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user('reader@example.com')
+        self.theme = Theme.objects.create(slug='fishing', name='Fishing')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def create_user(self, email):
+        user = MyUser.objects.create_user(email=email, password='pass1234')
+        user.is_active = True
+        user.save()
+        return user
+
+    def use_temp_media(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = self.settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_posts(self, count, **kwargs):
+        return [Post.objects.create(author=self.user, theme=self.theme, title=f'Post {n}', text='text', **kwargs)
+                for n in range(count)]
+
+
+class ListQueryBudgetTest(ForumTestCase):
+    """The list endpoints stay within a fixed number of queries, however many rows they return."""
+
+    def setUp(self):
+        super().setUp()
+        self.posts = self.create_posts(self.rows)
+        for post in self.posts:
+            Rating.objects.create(author=self.user, post=post, rating=4)
+            Likes.objects.create(author=self.user, post=post, likes=True)
+            Favorite.objects.create(user=self.user, post=post, favorite=True)
+            Comment.objects.create(author=self.user, post=post, text='comment')
+        self.client.get('/v1/api/rating/')  # warm the token cache
+
+    def test_rating_list(self):
+        with QueryBudget(2):
+            response = self.client.get('/v1/api/rating/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.rows)
+
+    def test_likes_list(self):
+        with QueryBudget(2):
+            response = self.client.get('/v1/api/likes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.rows)
+
+    def test_favorite_list(self):
+        with QueryBudget(2):
+            response = self.client.get('/v1/api/favorite/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.rows)
+
+    def test_favorites_actions(self):
+        for path in ('/v1/api/favorite/favorites/', '/v1/api/post/favorites/'):
+            with self.subTest(path=path), QueryBudget(1):
+                response = self.client.get(path)
+            self.assertEqual(len(response.data), self.rows)
+
+    def test_comment_list(self):
+        with QueryBudget(1):
+            response = self.client.get('/v1/api/comments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_post_comments(self):
+        with QueryBudget(2):
+            response = self.client.get(f'/v1/api/post/{self.posts[0].pk}/comments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+
+class QueryProfilingMiddlewareTest(ForumTestCase):
+    def test_async_capable(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryProfilingMiddleware(get_response)))
+        self.assertFalse(iscoroutinefunction(QueryProfilingMiddleware(lambda request: HttpResponse())))
+
+    def test_server_timing(self):
+        middleware = ['main.profiling.QueryProfilingMiddleware', 'django.middleware.common.CommonMiddleware']
+        with self.settings(QUERY_PROFILING=True, MIDDLEWARE=middleware), \
+                self.assertLogs('main.profiling', level='INFO') as logs:
+            response = self.client.get('/v1/api/rating/')
+        self.assertIn('queries', response['Server-Timing'])
+        self.assertEqual(logs.records[0].profile['view'], 'main.views.RatingViewSet')
+
+
+class CounterUpdateTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post, self.other = self.create_posts(2)
+
+    def assertCounters(self, post, **counters):
+        post.refresh_from_db()
+        self.assertEqual({name: getattr(post, name) for name in counters}, counters)
+
+    def test_like_update(self):
+        response = self.client.post('/v1/api/likes/', {'post': self.post.pk})
+        self.assertCounters(self.post, like_count=1)
+        self.client.patch(f'/v1/api/likes/{response.data["id"]}/', {'likes': False})
+        self.assertCounters(self.post, like_count=0)
+        self.client.patch(f'/v1/api/likes/{response.data["id"]}/', {'likes': True, 'post': self.other.pk})
+        self.assertCounters(self.post, like_count=0)
+        self.assertCounters(self.other, like_count=1)
+
+    def test_favorite_update(self):
+        response = self.client.post('/v1/api/favorite/', {'post': self.post.pk, 'user': self.user.pk, 'favorite': True})
+        self.assertCounters(self.post, favorite_count=1)
+        self.client.patch(f'/v1/api/favorite/{response.data["id"]}/', {'favorite': False})
+        self.assertCounters(self.post, favorite_count=0)
+        self.client.patch(f'/v1/api/favorite/{response.data["id"]}/', {'favorite': True, 'post': self.other.pk})
+        self.assertCounters(self.post, favorite_count=0)
+        self.assertCounters(self.other, favorite_count=1)
+
+    def test_comment_update(self):
+        response = self.client.post('/v1/api/comments/', {'post': self.post.pk, 'text': 'comment'})
+        self.assertCounters(self.post, comment_count=1)
+        self.client.patch(f'/v1/api/comments/{response.data["id"]}/', {'text': 'edited'})
+        self.assertCounters(self.post, comment_count=1)
+        self.client.patch(f'/v1/api/comments/{response.data["id"]}/', {'post': self.other.pk})
+        self.assertCounters(self.post, comment_count=0)
+        self.assertCounters(self.other, comment_count=1)
+
+    def test_move_onto_voted_post(self):
+        for path, data in (('/v1/api/likes/', {}), ('/v1/api/rating/', {'rating': 4})):
+            with self.subTest(path=path):
+                first = self.client.post(path, {'post': self.post.pk, **data}).data['id']
+                self.client.post(path, {'post': self.other.pk, **data})
+                response = self.client.patch(f'{path}{first}/', {'post': self.other.pk})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('post', response.data)
+
+    def test_favorite_move_onto_favorited_post(self):
+        data = {'user': self.user.pk, 'favorite': True}
+        first = self.client.post('/v1/api/favorite/', {'post': self.post.pk, **data}).data['id']
+        self.client.post('/v1/api/favorite/', {'post': self.other.pk, **data})
+        response = self.client.patch(f'/v1/api/favorite/{first}/', {'post': self.other.pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkWriteTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = self.create_posts(3)
+        self.other = self.create_user('other@example.com')
+
+    def test_bulk_rating(self):
+        payload = [{'post': post.pk, 'value': 4} for post in self.posts]
+        response = self.client.post('/v1/api/rating/bulk/', payload, format='json')
+        self.assertEqual(response.data, {'created': 3, 'updated': 0})
+        payload[0]['value'] = 2
+        with QueryBudget(7):  # post check, savepoint, lock, select, upsert, recount, release
+            response = self.client.post('/v1/api/rating/bulk/', payload, format='json')
+        self.assertEqual(response.data, {'created': 0, 'updated': 1})
+        self.posts[0].refresh_from_db()
+        self.assertEqual((self.posts[0].rating_sum, self.posts[0].rating_count), (2, 1))
+
+    def test_counters_include_concurrent_votes(self):
+        # another writer's row committed without this writer having seen it
+        Rating.objects.bulk_create([Rating(author=self.other, post=self.posts[0], rating=5)])
+        Likes.objects.bulk_create([Likes(author=self.other, post=self.posts[0], likes=True)])
+        self.client.post('/v1/api/rating/bulk/', [{'post': self.posts[0].pk, 'value': 3}], format='json')
+        self.client.post('/v1/api/likes/bulk/', [{'post': self.posts[0].pk, 'value': True}], format='json')
+        self.posts[0].refresh_from_db()
+        self.assertEqual((self.posts[0].rating_sum, self.posts[0].rating_count), (8, 2))
+        self.assertEqual(self.posts[0].like_count, 2)
+
+    def test_unknown_post(self):
+        response = self.client.post('/v1/api/favorite/bulk/', [{'post': 999, 'value': True}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PostListQueriesTest(ForumTestCase):
+    """Posts, their images, renditions and latest comments load in a fixed number of queries."""
+
+    def create_posts(self, count, **kwargs):
+        posts = super().create_posts(count, **kwargs)
+        for post in posts:
+            for n in range(2):
+                image = PostImage.objects.create(post=post, image=f'posts/{post.pk}-{n}.jpg')
+                PostImageRendition.objects.create(post_image=image, image=f'posts/renditions/{post.pk}-{n}.webp',
+                                                  format='webp', width=320, height=240)
+            for n in range(5):
+                Comment.objects.create(author=self.user, post=post, text=f'comment {n}')
+        return posts
+
+    def test_constant_queries(self):
+        self.create_posts(1)
+        self.client.get('/v1/api/post/')  # resolve and cache the token
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/v1/api/post/')
+        self.create_posts(PostCursorPagination.page_size + 2)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get('/v1/api/post/')
+        self.assertEqual(len(response.data['results']), PostCursorPagination.page_size)
+        for post in response.data['results']:
+            self.assertEqual(len(post['images']), 2)
+            self.assertEqual(len(post['comments']), LATEST_COMMENTS)
+
+    def test_detail(self):
+        post, = self.create_posts(1)
+        self.client.get(f'/v1/api/post/{post.pk}/')
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/v1/api/post/{post.pk}/')
+        self.assertEqual(len(response.data['images']), 2)
+
+
+class ImageSweepTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media()
+        self.post, = self.create_posts(1)
+
+    def upload(self):
+        return PostImage.objects.create(post=self.post, image=SimpleUploadedFile('photo.jpg', b'same bytes'))
+
+    def age(self, image, seconds):
+        path = image.image.path
+        os.utime(path, (time.time() - seconds, time.time() - seconds))
+        return path
+
+    def test_sweep_keeps_referenced_and_recent_files(self):
+        first, second = self.upload(), self.upload()
+        self.assertEqual(first.image.name, second.image.name)
+        path = self.age(first, 2 * IMAGE_SWEEP_GRACE)
+        first.delete()
+        self.assertEqual(sweep_post_images(), 0)
+        second.delete()
+        self.upload().delete()  # the re-upload touches the blob
+        self.assertEqual(sweep_post_images(), 0)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(sweep_post_images(grace=0), 1)
+        self.assertFalse(os.path.exists(path))
+
+
+class PostFragmentCacheTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post, = self.create_posts(1)
+        PostImage.objects.create(post=self.post, image='posts/photo.jpg')
+
+    def test_theme_change_refreshes_fragments(self):
+        self.client.get(f'/v1/api/post/{self.post.pk}/')
+        self.theme.name = 'Sea fishing'
+        self.theme.save()
+        response = self.client.get(f'/v1/api/post/{self.post.pk}/')
+        self.assertEqual(response.data['theme']['name'], 'Sea fishing')
+
+    def test_scheme_is_part_of_the_key(self):
+        self.client.get(f'/v1/api/post/{self.post.pk}/')
+        response = self.client.get(f'/v1/api/post/{self.post.pk}/', secure=True)
+        self.assertTrue(response.data['images'][0]['image'].startswith('https://'))
+
+
+class PostImageIdsTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post, = self.create_posts(1)
+        self.images = [PostImage.objects.create(post=self.post, image=f'posts/{n}.jpg') for n in range(2)]
+
+    def test_keeps_listed_images(self):
+        for data, format in (({'image_ids': [self.images[0].pk]}, 'json'),
+                             ({'image_ids': [str(self.images[0].pk)]}, 'multipart')):
+            with self.subTest(format=format):
+                response = self.client.patch(f'/v1/api/post/{self.post.pk}/', data, format=format)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(self.post.images.values_list('pk', flat=True)), [self.images[0].pk])
+
+    def test_rejects_scalars(self):
+        for value in (str(self.images[0].pk), self.images[0].pk, {'id': 1}):
+            with self.subTest(value=value):
+                response = self.client.patch(f'/v1/api/post/{self.post.pk}/', {'image_ids': value}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post.images.count(), 2)
+
+
+class ProcessPostImageTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media()
+        self.post, = self.create_posts(1)
+
+    def test_renditions(self):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'blue').save(buffer, 'PNG')
+        image = PostImage.objects.create(post=self.post, image=SimpleUploadedFile('photo.png', buffer.getvalue()))
+        process_post_image(image.pk)
+        self.assertEqual(sorted(image.renditions.values_list('width', 'format')),
+                         [(320, 'jpeg'), (320, 'webp'), (640, 'jpeg'), (640, 'webp')])
+
+    def test_not_an_image_is_not_retried(self):
+        image = PostImage.objects.create(post=self.post, image=SimpleUploadedFile('photo.jpg', b'not an image'))
+        with mock.patch.object(process_post_image, 'retry') as retry:
+            process_post_image.delay(image.pk)
+        retry.assert_not_called()
+        self.assertFalse(image.renditions.exists())
+
+
+class WeekFilterTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_posts(1)
+
+    def test_invalid_week(self):
+        for path in ('/v1/api/async/post/', '/v1/api/post/'):
+            for week in ('abc', '10' * 20):
+                with self.subTest(path=path, week=week):
+                    response = self.client.get(path, {'week': week})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('week', response.json())
+
+    def test_week(self):
+        for path in ('/v1/api/async/post/', '/v1/api/post/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, {'week': 1})
+                self.assertEqual(len(response.json()['results']), 1)
+
+
+class HotPostsTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_theme = Theme.objects.create(slug='boats', name='Boats')
+        self.posts = self.create_posts(5)
+        self.posts += [Post.objects.create(author=self.user, theme=self.other_theme, title=f'Boat {n}', text='text')
+                       for n in range(3)]
+        # engagement is the like count plus half the rating sum: 0, 6, 2, 8, 4 | 10, 6, 12
+        for count, post in enumerate(self.posts):
+            Post.objects.filter(pk=post.pk).update(like_count=count, rating_sum=count % 2 * 10, rating_count=count % 2)
+
+    def ids(self, entries):
+        return [entry['id'] for entry in entries]
+
+    def test_batches_match_a_single_pass(self):
+        rank_hot_posts(limit=2, batch_size=len(self.posts))
+        expected = {theme: self.ids(get_hot_posts(theme)) for theme in (None, 'fishing', 'boats')}
+        rank_hot_posts(limit=2, batch_size=3)
+        self.assertEqual({theme: self.ids(get_hot_posts(theme)) for theme in expected}, expected)
+
+    def test_leaders(self):
+        self.assertEqual(rank_hot_posts(limit=2, batch_size=3), 3)
+        fishing, boats = self.posts[:5], self.posts[5:]
+        self.assertEqual(self.ids(get_hot_posts('fishing')), [fishing[3].pk, fishing[1].pk])
+        self.assertEqual(self.ids(get_hot_posts('boats')), [boats[2].pk, boats[0].pk])
+        self.assertEqual(self.ids(get_hot_posts()), [boats[2].pk, boats[0].pk])
+        self.assertEqual(self.client.get('/v1/api/post/hot/', {'theme': 'boats'}).json(), get_hot_posts('boats'))
+
+    def test_archived_posts_are_not_ranked(self):
+        Post.objects.filter(theme=self.other_theme).update(status=Post.Status.ARCHIVED)
+        self.assertEqual(rank_hot_posts(), 2)
+        self.assertEqual(get_hot_posts('boats'), [])
+
+
+class PostDeleteTest(ForumTestCase):
+    def create_post(self, comments):
+        post, = self.create_posts(1)
+        Comment.objects.bulk_create(Comment(author=self.user, post=post, text='comment') for _ in range(comments))
+        Likes.objects.create(author=self.user, post=post)
+        PostImage.objects.create(post=post, image='posts/photo.jpg')
+        return post
+
+    def test_cascade_is_not_per_row(self):
+        post = self.create_post(1)
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        post = self.create_post(30)
+        with self.assertNumQueries(len(queries)):
+            post.delete()
+        self.assertFalse(Comment.objects.exists())
+
+
+class RebuildCountersTest(ForumTestCase):
+    def test_rebuild_refreshes_fragments(self):
+        post, = self.create_posts(1)
+        Likes.objects.bulk_create([Likes(author=self.user, post=post, likes=True)])
+        self.assertEqual(self.client.get(f'/v1/api/post/{post.pk}/').data['likes'], 0)
+        call_command('rebuild_post_counters', stdout=StringIO())
+        self.assertEqual(self.client.get(f'/v1/api/post/{post.pk}/').data['likes'], 1)
+
+
+class DraftAccessTest(ForumTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = self.create_user('author@example.com')
+        self.draft = Post.objects.create(author=self.author, theme=self.theme, title='Secret', text='text',
+                                         status=Post.Status.DRAFT)
+        Comment.objects.create(author=self.author, post=self.draft, text='hidden comment')
+        Favorite.objects.create(user=self.user, post=self.draft, favorite=True)
+
+    def test_cannot_write_to_others_drafts(self):
+        requests = (
+            ('/v1/api/likes/', {'post': self.draft.pk}),
+            ('/v1/api/comments/', {'post': self.draft.pk, 'text': 'comment'}),
+            ('/v1/api/rating/', {'post': self.draft.pk, 'rating': 5}),
+            ('/v1/api/favorite/', {'post': self.draft.pk, 'user': self.user.pk, 'favorite': True}),
+        )
+        for path, data in requests:
+            with self.subTest(path=path):
+                response = self.client.post(path, data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('post', response.data)
+        response = self.client.post('/v1/api/likes/bulk/', [{'post': self.draft.pk, 'value': True}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.draft.refresh_from_db()
+        self.assertEqual((self.draft.like_count, self.draft.comment_count), (0, 0))
+
+    def test_others_drafts_are_not_listed(self):
+        self.assertEqual(self.client.get('/v1/api/comments/').data['results'], [])
+        self.assertEqual(self.client.get('/v1/api/favorite/favorites/').data, [])
+        self.assertEqual(self.client.get('/v1/api/post/favorites/').data, [])
+
+    def test_author_can_use_own_draft(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/v1/api/comments/', {'post': self.draft.pk, 'text': 'note'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.client.get('/v1/api/comments/').data['results']), 2)
+
+
+class AsyncPageTest(ForumTestCase):
+    def test_invalid_pages_match_sync_views(self):
+        self.create_posts(5)
+        for async_path, sync_path in (('/v1/api/async/themes/', '/v1/api/themes/'),
+                                      ('/v1/api/async/posts/', '/v1/api/posts/')):
+            for page in ('abc', '0', '99', '9' * 23):
+                with self.subTest(path=async_path, page=page):
+                    self.assertEqual(self.client.get(sync_path, {'page': page}).status_code, 404)
+                    response = self.client.get(async_path, {'page': page})
+                    self.assertEqual(response.status_code, 404)
+                    self.assertEqual(response.json(), {'detail': 'Invalid page.'})
+
+    def test_pages(self):
+        self.create_posts(5)
+        first = self.client.get('/v1/api/async/posts/').json()
+        self.assertEqual((first['count'], len(first['results'])), (5, 4))
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get('/v1/api/async/themes/', {'page': 1}).status_code, 200)
+
+
+class SparseFieldsTest(ForumTestCase):
+    """``?fields`` trims both the payload and the columns and joins each list reads."""
+
+    def setUp(self):
+        super().setUp()
+        for post in self.create_posts(3):
+            PostImage.objects.create(post=post, image=f'posts/{post.pk}.jpg')
+            Comment.objects.create(author=self.user, post=post, text='comment')
+        self.client.get('/v1/api/comments/')  # resolve and cache the token
+
+    def get(self, path, queries):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(captured), queries)
+        return response.data['results'], [query['sql'] for query in captured]
+
+    def test_posts_id_title(self):
+        results, (_, sql) = self.get('/v1/api/posts/?fields=id,title', 2)
+        self.assertEqual([set(post) for post in results], [{'id', 'title'}] * 3)
+        self.assertIn('"main_post"."title"', sql)
+        self.assertNotIn('"main_post"."theme_id"', sql)
+
+    def test_posts_empty_fields(self):
+        results, (_, sql) = self.get('/v1/api/posts/?fields', 2)
+        self.assertEqual(results, [{}] * 3)
+        self.assertNotIn('"main_post"."title"', sql)
+
+    def test_post_comments_only(self):
+        results, (sql, _) = self.get('/v1/api/post/?fields=comments', 2)
+        self.assertEqual([set(post) for post in results], [{'comments'}] * 3)
+        self.assertEqual([len(post['comments']) for post in results], [1] * 3)
+        self.assertNotIn('"main_post"."text"', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_post_empty_fields(self):
+        results, _ = self.get('/v1/api/post/?fields', 1)
+        self.assertEqual(results, [{}] * 3)
+
+    def test_comments_id_text(self):
+        results, (sql,) = self.get('/v1/api/comments/?fields=id,text', 1)
+        self.assertEqual([set(comment) for comment in results], [{'id', 'text'}] * 3)
+        self.assertNotIn('account_myuser', sql)
+
+    def test_comments_unknown_and_empty_fields(self):
+        for path in ('/v1/api/comments/?fields=comments', '/v1/api/comments/?fields'):
+            with self.subTest(path=path):
+                results, (sql,) = self.get(path, 1)
+                self.assertEqual(results, [{}] * 3)
+                self.assertNotIn('"main_comment"."text"', sql)
+
+    def test_comments_author_joins_user(self):
+        results, (sql,) = self.get('/v1/api/comments/?fields=author', 1)
+        self.assertEqual(results, [{'author': self.user.email}] * 3)
+        self.assertIn('account_myuser', sql)
+
+
+class SearchTest(ForumTestCase):
+    """The inverted-index backend the search action falls back to off PostgreSQL."""
+
+    def post(self, title, text='', **kwargs):
+        return Post.objects.create(author=self.user, theme=self.theme, title=title, text=text, **kwargs)
+
+    def search(self, q):
+        response = self.client.get('/v1/api/post/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [post['title'] for post in response.data['results']]
+
+    def test_prefix_match(self):
+        self.post('Fishing rods')
+        self.post('Boats', 'A rod holder')
+        self.assertEqual(self.search('FISH'), ['Fishing rods'])
+        self.assertEqual(self.search('rod'), ['Fishing rods', 'Boats'])
+        self.assertEqual(self.search('fish rod'), ['Fishing rods'])
+        self.assertEqual(self.search('fish boat'), [])
+
+    def test_title_outranks_text(self):
+        self.post('Carp', 'bait')
+        self.post('Bait', 'carp')
+        self.post('Pike', 'carp and more carp')
+        self.assertEqual(self.search('carp'), ['Carp', 'Pike', 'Bait'])
+
+    def test_reindexed_after_title_change(self):
+        post = self.post('Carp')
+        post.title = 'Salmon'
+        post.save()
+        self.assertEqual(self.search('salmon'), ['Salmon'])
+        self.assertEqual(self.search('carp'), [])
+        self.assertEqual(PostSearchTerm.objects.filter(post=post).count(), 1)
+
+    def test_drafts_excluded(self):
+        self.post('Carp draft', status=Post.Status.DRAFT)
+        self.post('Carp')
+        self.assertEqual(self.search('carp'), ['Carp'])
+
+    def test_empty_query(self):
+        self.post('Carp')
+        for q in ('', ' ', 'a', '!?'):
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), [])
+
+
+class ServeMediaTest(ForumTestCase):
+    hashed = 'posts/' + 'ab' * 32 + '.jpg'
+    plain = 'avatars/photo.jpg'
+
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media()
+        for path in (self.hashed, self.plain):
+            os.makedirs(os.path.join(settings.MEDIA_ROOT, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(settings.MEDIA_ROOT, path), 'wb') as file:
+                file.write(b'0123456789')
+
+    def get(self, path, headers=None):
+        response = self.client.get(settings.MEDIA_URL + path, headers=headers)
+        self.addCleanup(response.close)
+        return response
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], '"%s"' % ('ab' * 32))
+
+    def test_cache_control(self):
+        self.assertEqual(self.get(self.hashed)['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.get(self.plain)['Cache-Control'], REVALIDATE_CACHE_CONTROL)
+
+    def test_ranges(self):
+        for header, body, content_range in (('bytes=2-5', b'2345', 'bytes 2-5/10'),
+                                            ('bytes=7-', b'789', 'bytes 7-9/10'),
+                                            ('bytes=8-20', b'89', 'bytes 8-9/10'),
+                                            ('bytes=-3', b'789', 'bytes 7-9/10'),
+                                            ('bytes=-20', b'0123456789', 'bytes 0-9/10')):
+            with self.subTest(range=header):
+                response = self.get(self.plain, {'Range': header})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.content(response), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(range=header):
+                response = self.get(self.plain, {'Range': header})
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_multiple_ranges_send_whole_file(self):
+        response = self.get(self.plain, {'Range': 'bytes=0-1,4-5'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b'0123456789')
+
+    def test_not_modified(self):
+        for path, cache_control in ((self.hashed, IMMUTABLE_CACHE_CONTROL), (self.plain, REVALIDATE_CACHE_CONTROL)):
+            with self.subTest(path=path):
+                etag = self.get(path)['ETag']
+                response = self.get(path, {'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response['Cache-Control'], cache_control)
+
+    def test_if_range(self):
+        full = self.get(self.plain)
+        for if_range, status in ((full['ETag'], 206), (full['Last-Modified'], 206),
+                                 ('"stale"', 200), ('Thu, 01 Jan 1970 00:00:00 GMT', 200)):
+            with self.subTest(if_range=if_range):
+                response = self.get(self.plain, {'Range': 'bytes=0-1', 'If-Range': if_range})
+                self.assertEqual(response.status_code, status)
+
+    def test_offload(self):
+        for mode, header, value in (
+            ('x-accel-redirect', 'X-Accel-Redirect', '/protected-media/' + self.hashed),
+            ('x-sendfile', 'X-Sendfile', os.path.join(settings.MEDIA_ROOT, self.hashed)),
+        ):
+            with self.subTest(mode=mode), self.settings(MEDIA_OFFLOAD=mode):
+                response = self.get(self.hashed, {'Range': 'bytes=0-1'})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response[header], value)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+                self.assertEqual(self.get(self.hashed, {'If-None-Match': response['ETag']}).status_code, 304)
+
+    def test_missing_and_outside_media_root(self):
+        for path in ('avatars/missing.jpg', '../settings.py', 'avatars'):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path).status_code, 404)
+
+
+class ResponseCacheTest(ForumTestCase):
+    paths = ('/v1/api/themes/', '/v1/api/themes/fishing/', '/v1/api/posts/')
+
+    def setUp(self):
+        super().setUp()
+        self.post, = self.create_posts(1)
+        self.client.get('/v1/api/comments/')  # resolve and cache the token
+
+    def cache_status(self):
+        return {path: self.client.get(path)['X-Cache'] for path in self.paths}
+
+    def test_hit_after_miss(self):
+        self.assertEqual(set(self.cache_status().values()), {'MISS'})
+        for path in self.paths:
+            with self.subTest(path=path), self.assertNumQueries(0):
+                response = self.client.get(path)
+            self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get('/v1/api/posts/', {'page': 1})['X-Cache'], 'MISS')
+        self.assertEqual(get_stats(), {'hits': 3, 'misses': 4})
+
+    def test_post_save_invalidates_post_lists(self):
+        self.cache_status()
+        self.post.title = 'Renamed'
+        self.post.save()
+        self.assertEqual(self.cache_status(), {'/v1/api/themes/': 'HIT', '/v1/api/themes/fishing/': 'MISS',
+                                               '/v1/api/posts/': 'MISS'})
+        self.assertEqual(self.client.get('/v1/api/posts/').data['results'][0]['title'], 'Renamed')
+
+    def test_theme_save_invalidates_theme_lists(self):
+        self.cache_status()
+        Theme.objects.create(slug='boats', name='Boats')
+        self.assertEqual(self.cache_status(), {'/v1/api/themes/': 'MISS', '/v1/api/themes/fishing/': 'MISS',
+                                               '/v1/api/posts/': 'HIT'})
+        self.assertEqual(len(self.client.get('/v1/api/themes/').data['results']), 2)
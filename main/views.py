@@ -1,70 +1,84 @@
 from datetime import timedelta
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
 from rest_framework import generics, viewsets, status
+from rest_framework.generics import get_object_or_404
 from rest_framework.decorators import api_view, action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from .models import Theme, PostImage, Post
+from .models import Theme, PostImage, Post, with_visible_posts
+from main.bulk import favorite_writer, likes_writer, rating_writer
+from main.cache import CachedListMixin
+from main.pagination import PostCursorPagination, CommentCursorPagination, SearchPagination, \
+    ThemePageCursorPagination
 from main.permissions import IsPostAuthor
+from main.ranking import get_hot_posts
+from main.search import search_posts
 from .serializers import *
 
 
-class MyPaginationClass(PageNumberPagination):
-    page_size = 3
+def toggle_favorite(user, post):
+    return favorite_writer.toggle(user, post.pk)
 
-    def get_paginated_response(self, data):
-        for i in range(self.page_size):
-            text = data[1]['text']
-            data[i]['text'] = text[:15] + '...'
-        return super().get_paginated_response(data)
 
+class BulkWriteMixin:
+    """Adds ``POST <prefix>/bulk/`` taking a list of ``{"post": id, "value": ...}`` items."""
+    bulk_serializer_class = None
+    bulk_writer = None
+    bulk_max_items = 1000
 
-class ThemeListView(generics.ListAPIView):
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        serializer = self.bulk_serializer_class(data=request.data, many=True, max_length=self.bulk_max_items,
+                                                context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        result = self.bulk_writer.write(request.user, serializer.validated_data)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class ThemeListView(CachedListMixin, generics.ListAPIView):
+    cache_namespaces = ('theme',)
     queryset = Theme.objects.all()
     serializer_class = ThemeSerializer
     permission_classes = [AllowAny, ]
 
 
-class ThemesPageListView(generics.ListAPIView):
-    model = Post
+class ThemesPageListView(CachedListMixin, generics.ListAPIView):
+    cache_namespaces = ('post', 'theme')
     serializer_class = ThemesPageSerializer
-    queryset = Post.objects.all()
-    context_object_name = 'post'
-    paginate_by = 3
+    permission_classes = [AllowAny, ]
+    pagination_class = ThemePageCursorPagination
+    public_statuses = (Post.Status.PUBLISHED, Post.Status.ARCHIVED)
 
     def get_queryset(self):
-        queryset = super().get_queryset()  # all
-        slug = self.kwargs.get('slug')
-        filter_word = self.request.GET.get('filter')
-        if filter_word:
-            queryset = queryset.filter(theme__slug=slug,
-                                       status=filter_word)
-        else:
-            queryset = queryset.filter(theme__slug=slug)
-        return queryset
-
-    def get_context_data(self, *, object_list=None, **kwargs):
-        context = super(ThemesPageListView, self).get_context_data()
-        context['slug'] = self.kwargs.get('slug')
-        return
-
-
-class PostsListView(generics.ListAPIView):
-    queryset = Post.objects.all()
+        status_filter = self.request.query_params.get('filter', Post.Status.PUBLISHED)
+        if status_filter not in self.public_statuses:
+            raise ValidationError({'filter': f'Expected one of: {", ".join(self.public_statuses)}.'})
+        # created_at is kept for the pagination cursor; text is never fetched
+        return Post.objects.filter(theme_id=self.kwargs.get('slug'), status=status_filter).only(
+            'id', 'title', 'created_at',
+        )
+
+
+class PostsListView(CachedListMixin, generics.ListAPIView):
+    cache_namespaces = ('post',)
+    queryset = Post.objects.published().order_by('-created_at', '-id')
     serializer_class = PostsSerializer
     permission_classes = [AllowAny, ]
 
+    def get_queryset(self):
+        return PostsSerializer.narrow_queryset(super().get_queryset(), self.request)
+
 
 class PostsViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated, ]
-    pagination_class = MyPaginationClass
+    pagination_class = PostCursorPagination
     queryset_any = Favorite.objects.all()
 
     def get_serializer_context(self):
@@ -78,13 +92,27 @@ class PostsViewSet(viewsets.ModelViewSet):
             permissions = [IsAuthenticated]
         return [permission() for permission in permissions]
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return PostListSerializer
+        if self.action == 'comments':
+            return CommentSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
-        queryset = super().get_queryset()
-        weeks_count = int(self.request.query_params.get('week', 0))
-        if weeks_count > 0:
-            start_date = timezone.now() - timedelta(weeks=weeks_count)
-            queryset = queryset.filter(created_at__gte=start_date)
-        return queryset
+        queryset = super().get_queryset().with_details()
+        if self.action in ('list', 'search'):
+            queryset = queryset.published()
+        elif self.action != 'own':
+            queryset = queryset.visible_to(self.request.user)
+        try:
+            weeks_count = int(self.request.query_params.get('week', 0))
+            if weeks_count > 0:
+                start_date = timezone.now() - timedelta(weeks=weeks_count)
+                queryset = queryset.filter(created_at__gte=start_date)
+        except (ValueError, OverflowError):
+            raise ValidationError({'week': 'Expected a whole number of weeks.'})
+        return self.get_serializer_class().narrow_queryset(queryset, self.request)
 
     @action(detail=False, methods=['get'])
     def own(self, request, pk=None):
@@ -95,27 +123,39 @@ class PostsViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def search(self, request, pk=None):
-        q = request.query_params.get('q')
-        queryset = self.get_queryset()
-        queryset = queryset.filter(Q(title__icontains=q) |
-                                   Q(text__icontains=q))
-        serializer = PostSerializer(queryset, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        q = request.query_params.get('q', '')
+        queryset = search_posts(self.get_queryset(), q)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = PostSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def favorites(self, request):
-        queryset = Favorite.objects.all()
-        queryset = queryset.filter(user=request.user)
+        queryset = Favorite.objects.select_related('post')
+        queryset = with_visible_posts(queryset.filter(user=request.user), request.user)
         serializer = FavoriteSerializer(queryset, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'])
+    def comments(self, request, pk=None):
+        post = get_object_or_404(Post.objects.visible_to(request.user).only('id'), pk=pk)
+        queryset = Comment.objects.filter(post_id=post.pk).select_related('author')
+        queryset = CommentSerializer.narrow_queryset(queryset, request)
+        paginator = CommentCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = CommentSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def hot(self, request):
+        # precomputed by the refresh_hot_posts beat task, served from one cache key
+        return Response(get_hot_posts(request.query_params.get('theme')), status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_favorites(self, request, pk=None):
         post = self.get_object()
-        obj, created = Favorite.objects.get_or_create(user=request.user, post=post, )
-        if not created:
-            obj.favorite = not obj.favorite
-            obj.save()
+        obj = toggle_favorite(request.user, post)
         favorites = 'added to favorites' if obj.favorite else 'removed to favorites'
 
         return Response('Successfully {} !'.format(favorites), status=status.HTTP_200_OK)
@@ -125,7 +165,7 @@ class PostsViewSet(viewsets.ModelViewSet):
 
 
 class PostImageView(generics.ListCreateAPIView):
-    queryset = PostImage.objects.all()
+    queryset = PostImage.objects.prefetch_related('renditions')
     serializer_class = PostImageSerializer
 
     def get_serializer_context(self):
@@ -133,9 +173,27 @@ class PostImageView(generics.ListCreateAPIView):
 
 
 class CommentViewSet(ModelViewSet):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated, ]
+    pagination_class = CommentCursorPagination
+
+    def get_queryset(self):
+        queryset = with_visible_posts(super().get_queryset(), self.request.user)
+        return CommentSerializer.narrow_queryset(queryset, self.request)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = Comment.objects.select_for_update().get(pk=serializer.instance.pk)
+        comment = serializer.save()
+        if comment.post_id != old.post_id:
+            Post.objects.update_counters(old.post_id, comment_count=-1)
+            Post.objects.update_counters(comment.post_id, comment_count=1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        Post.objects.update_counters(instance.post_id, comment_count=-1)
+        instance.delete()
 
 
 class PermissionMixin:
@@ -149,9 +207,14 @@ class PermissionMixin:
         return [permission() for permission in permissions]
 
 
-class RatingViewSet(PermissionMixin, ModelViewSet):
-    queryset = Rating.objects.all()
+class RatingViewSet(BulkWriteMixin, PermissionMixin, ModelViewSet):
+    queryset = Rating.objects.select_related('post')
     serializer_class = RatingSerializer
+    bulk_serializer_class = BulkRatingSerializer
+    bulk_writer = rating_writer
+
+    def get_queryset(self):
+        return with_visible_posts(super().get_queryset(), self.request.user)
 
     def get_serializer_context(self):
         return {
@@ -162,32 +225,89 @@ class RatingViewSet(PermissionMixin, ModelViewSet):
         kwargs['context'] = self.get_serializer_context()
         return self.serializer_class(*args, **kwargs)
 
+    def perform_create(self, serializer):
+        # rating a post again replaces the previous rating
+        post = serializer.validated_data['post']
+        rating_writer.write(self.request.user, {post.pk: serializer.validated_data['rating']})
+        serializer.instance = Rating.objects.get(author=self.request.user, post=post)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = Rating.objects.select_for_update().get(pk=serializer.instance.pk)
+        rating = serializer.save()
+        Post.objects.update_counters(old.post_id, rating_sum=-old.rating, rating_count=-1)
+        Post.objects.update_counters(rating.post_id, rating_sum=rating.rating, rating_count=1)
 
-class LikesViewSet(ModelViewSet):
-    queryset = Likes.objects.all()
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        Post.objects.update_counters(instance.post_id, rating_sum=-instance.rating, rating_count=-1)
+        instance.delete()
+
+
+class LikesViewSet(BulkWriteMixin, ModelViewSet):
+    queryset = Likes.objects.select_related('author')
     serializer_class = LikesSerializer
+    bulk_serializer_class = BulkLikesSerializer
+    bulk_writer = likes_writer
     permission_classes = [IsAuthenticated, ]
 
+    def get_queryset(self):
+        return with_visible_posts(super().get_queryset(), self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = Likes.objects.select_for_update().get(pk=serializer.instance.pk)
+        likes = serializer.save()
+        Post.objects.update_counters(old.post_id, like_count=-int(old.likes))
+        Post.objects.update_counters(likes.post_id, like_count=int(likes.likes))
 
-class FavoriteViewSet(ModelViewSet):
-    queryset = Favorite.objects.all()
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        if instance.likes:
+            Post.objects.update_counters(instance.post_id, like_count=-1)
+        instance.delete()
+
+
+class FavoriteViewSet(BulkWriteMixin, ModelViewSet):
+    queryset = Favorite.objects.select_related('post')
     serializer_class = FavoriteSerializer
+    bulk_serializer_class = BulkFavoriteSerializer
+    bulk_writer = favorite_writer
     permission_classes = [IsAuthenticated, ]
 
+    def get_queryset(self):
+        return with_visible_posts(super().get_queryset(), self.request.user)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        favorite = serializer.save()
+        if favorite.favorite:
+            Post.objects.update_counters(favorite.post_id, favorite_count=1)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old = Favorite.objects.select_for_update().get(pk=serializer.instance.pk)
+        favorite = serializer.save()
+        Post.objects.update_counters(old.post_id, favorite_count=-int(old.favorite))
+        Post.objects.update_counters(favorite.post_id, favorite_count=int(favorite.favorite))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        if instance.favorite:
+            Post.objects.update_counters(instance.post_id, favorite_count=-1)
+        instance.delete()
+
     @action(detail=False, methods=['get'])
     def favorites(self, request):
-        queryset = Favorite.objects.all()
-        queryset = queryset.filter(user=request.user)
+        queryset = Favorite.objects.select_related('post')
+        queryset = with_visible_posts(queryset.filter(user=request.user), request.user)
         serializer = FavoriteSerializer(queryset, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_favorites(self, request, pk=None):
         post = self.get_object()
-        obj, created = Favorite.objects.get_or_create(user=request.user, post=post, )
-        if not created:
-            obj.favorite = not obj.favorite
-            obj.save()
+        obj = toggle_favorite(request.user, post)
         favorites = 'added to favorites' if obj.favorite else 'removed to favorites'
 
         return Response('Successfully {} !'.format(favorites), status=status.HTTP_200_OK)